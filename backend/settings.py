@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from celery import Celery
 from celery.schedules import crontab
 from django.core.management.utils import get_random_secret_key
@@ -34,6 +35,7 @@ SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', get_random_secret_key())
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', 'True').lower() in ['true', '1', 't']
+TESTING = "test" in sys.argv[1:2]  # manage.py test runs without redis
 
 ALLOWED_HOSTS = os.getenv("DJANGO_ALLOWED_HOSTS", "127.0.0.1,localhost,0.0.0.0").split(",")
 DOMAIN = os.getenv("DOMAIN", "localhost:8000")
@@ -107,6 +109,8 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    'DEFAULT_PAGINATION_CLASS': 'utils.pagination.DefaultCursorPagination',
+    'PAGE_SIZE': 30,
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -218,6 +222,7 @@ CHANNEL_LAYERS = {
         },
     },
 }
+if TESTING: CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
 
 ANONYMOUS_USER = {
     "pk": -1,
@@ -233,6 +238,19 @@ USER_PROFILE_FOLDER = "profile"
 DEFAULT_USER_PICTURE_FORMAT = "default_profile_{id}.jpg"
 DEFAULT_USER_PICTURE_COUNT = 4
 
+CACHES = {
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_CACHE_URL", "redis://localhost:6379/1"),
+    },
+    "locmem": {  # per process, invalidation does not reach other workers: multi-worker setups need redis
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+
+if TESTING or (DEBUG and os.getenv("REDIS_CACHE_URL") is None): CACHES["default"] = CACHES["locmem"]
+else: CACHES["default"] = CACHES["redis"]
+
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
@@ -252,9 +270,9 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'event.tasks.check_flashbacks_nsfw',
         'schedule': timedelta(seconds=5),  # Runs every 5 seconds
     },
-    "process_flashbacks": {
-        'task': 'event.tasks.process_flashbacks',
-        'schedule': timedelta(seconds=5),  # Runs every 5 seconds
+    "sweep_flashbacks_processing": {
+        'task': 'event.tasks.sweep_flashbacks_processing',
+        'schedule': timedelta(minutes=5),  # processing is triggered on upload, this only recovers lost ones
     },
 }
 
@@ -325,6 +343,16 @@ AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN')
 AWS_S3_OBJECT_PARAMETERS = {'CacheControl': 'max-age=86400'}
 AWS_DEFAULT_REGION = "us-east-1"
 
+MODERATION_BACKEND = os.getenv("MODERATION_BACKEND", "utils.nsfw_detection.RekognitionModerationBackend")
+MODERATION_MAX_WORKERS = int(os.getenv("MODERATION_MAX_WORKERS", 8))
+MODERATION_MAX_RETRIES = int(os.getenv("MODERATION_MAX_RETRIES", 5))
+MODERATION_HASH_CACHE = os.getenv("MODERATION_HASH_CACHE", "True").lower() in ["true", "1", "t"]
+MODERATION_HASH_THRESHOLD = int(os.getenv("MODERATION_HASH_THRESHOLD", 4))  # max hamming distance of dHashes
+# utils.nsfw_detection.LocalModerationBackend
+MODERATION_FIXTURES = os.getenv("MODERATION_FIXTURES", None)
+MODERATION_LOCAL_MEDIA_ROOT = os.getenv("MODERATION_LOCAL_MEDIA_ROOT", None)
+MODERATION_LOCAL_LATENCY = float(os.getenv("MODERATION_LOCAL_LATENCY", 0))
+
 AWS_PUBLIC_MEDIA_LOCATION = 'media/public'
 DEFAULT_FILE_STORAGE = 'backend.storage_backends.PublicMediaStorage'
 
@@ -80,7 +80,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     @sync_to_async
     def get_user_events(self):
-        return list(self.user.events)
+        return list(self.user.events.all())
 
     async def add_user_to_group(self, event):
         event_id = event.get("event_id", None)
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from utils.fulltext import create_fulltext_index, drop_fulltext_index
+
+
+def create_message_fulltext_index(apps, schema_editor):
+    create_fulltext_index(schema_editor, "chat_message", ["content"])
+
+
+def drop_message_fulltext_index(apps, schema_editor):
+    drop_fulltext_index(schema_editor, "chat_message")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_alter_message_user_likedmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_message_fulltext_index, drop_message_fulltext_index),
+    ]
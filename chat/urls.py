@@ -3,5 +3,6 @@ from chat import views
 
 
 router = DefaultRouter()
+router.register(r"chat/search", views.MessageSearchViewSet, basename="chat-search")
 router.register(r"(?P<event_id>[^/.]+)/chat", views.MessageViewSet, basename="chat")
 urlpatterns = router.urls
@@ -1,10 +1,14 @@
-from rest_framework import viewsets
+from django.db.models import Exists, OuterRef
+from rest_framework import viewsets, mixins
 from rest_framework.permissions import IsAuthenticated
 
 from chat.serializers import MessageSerializer, MessageWritableSerializer
 from chat.models import Message
 from chat.permissions import IsEventMember
 from chat.pagination import MessageCursorPagination
+from event.models import EventMember
+from utils.fulltext import fulltext_filter
+from utils.views import parse_str_value, parse_int_value
 
 
 class MessageViewSet(viewsets.ModelViewSet):
@@ -24,3 +28,20 @@ class MessageViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, event_id=self.kwargs.get("event_id"))
+
+
+class MessageSearchViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """ Full text search of the messages of the chats of the events the user is a member of. """
+    permission_classes = [IsAuthenticated]
+    serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
+
+    def get_queryset(self):
+        messages = Message.objects.filter(
+            Exists(EventMember.objects.filter(event=OuterRef("event"), user=self.request.user))
+        ).select_related("user", "parent__user").prefetch_related("likedmessage_set__user")
+
+        event_id = parse_int_value(self.request.query_params, "event", default=None)
+        if event_id is not None:
+            messages = messages.filter(event_id=event_id)
+        return fulltext_filter(messages, parse_str_value(self.request.query_params, "q"))
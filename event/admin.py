@@ -12,3 +12,4 @@ admin.site.register(models.EventInviteCode)
 admin.site.register(models.EventInvite)
 admin.site.register(models.EventPosterTemplate)
 admin.site.register(models.EventPosterTemplateColorPalette)
+admin.site.register(models.EventPoster)
@@ -1,19 +1,94 @@
 from django.db import models
+from django.utils import timezone
+from django.db.models.functions import Coalesce, Now
 from event.status import EventStatus
 
 
 class EventQuerySet(models.QuerySet):
-    def filter_by_status(self, status: EventStatus) -> models.QuerySet:
-        status = [status]
-        if status[0] == EventStatus.OPENED.value: status.append(EventStatus.ACTIVE.value)
-        elif status[0] == EventStatus.ACTIVE.value: status.append(EventStatus.OPENED.value)
-        print(status)
+    def visible_to(self, user) -> models.QuerySet:
+        """ Events the user is a member or a viewer of. """
+        from event.models import EventMember, EventViewer
+        return self.filter(
+            models.Exists(EventMember.objects.filter(event=models.OuterRef("pk"), user=user))
+            | models.Exists(EventViewer.objects.filter(event=models.OuterRef("pk"), user=user))
+        )
 
-        return self.filter(id__in=[
-            instance.id for instance in self.all() if instance.status.value in status
-        ])
+    def with_status(self) -> models.QuerySet:
+        """ Annotates EventStatus value of every event as "current_status". """
+        return self.annotate(current_status=models.Case(
+            models.When(start_at__gt=Now(), then=models.Value(EventStatus.OPENED.value)),
+            models.When(end_at__lt=Now(), then=models.Value(EventStatus.CLOSED.value)),
+            default=models.Value(EventStatus.ACTIVE.value),
+            output_field=models.IntegerField(),
+        ))
+
+    def with_flashbacks_count(self) -> models.QuerySet:
+        from event.models import Flashback
+
+        flashbacks = Flashback.objects.filter(
+            event_member__event=models.OuterRef("pk")
+        ).order_by().values("event_member__event").annotate(count=models.Count("pk")).values("count")
+        return self.annotate(flashbacks_count=Coalesce(models.Subquery(flashbacks), 0))
+
+    def filter_by_status(self, status: int) -> models.QuerySet:
+        # opened and active events are filtered together
+        if status in (EventStatus.OPENED.value, EventStatus.ACTIVE.value):
+            return self.filter(end_at__gte=Now())
+        if status == EventStatus.CLOSED.value:
+            return self.filter(end_at__lt=Now())
+        return self.none()
+
+
+class EventViewerQuerySet(models.QuerySet):
+    def with_feed_data(self) -> models.QuerySet:
+        """
+        Loads everything EventViewerSerializer needs in a fixed count of queries,
+        annotates "is_host" and prefetches annotated events with "ordered_previews".
+        """
+        from event.models import Event, EventMember, EventMemberRole, EventPreview
+
+        return self.annotate(
+            is_host=models.Exists(EventMember.objects.filter(
+                event=models.OuterRef("event"), user=models.OuterRef("user"), role=EventMemberRole.HOST
+            ))
+        ).prefetch_related(
+            models.Prefetch("event", queryset=Event.objects.with_status().with_flashbacks_count()),
+            models.Prefetch(
+                "event__eventpreview_set",
+                queryset=EventPreview.objects.select_related("flashback").order_by("order"),
+                to_attr="ordered_previews",
+            ),
+        )
+
+    def update_unseen_count(self) -> int:
+        from event.models import FlashbackViewer
+
+        unseen = FlashbackViewer.objects.filter(
+            event_viewer=models.OuterRef("pk"), is_seen=False
+        ).order_by().values("event_viewer").annotate(count=models.Count("pk")).values("count")
+        return self.update(unseen_count=Coalesce(models.Subquery(unseen), 0))
 
 
 class FlashbackQuerySet(models.QuerySet):
+    def nsfw_check_due(self) -> models.QuerySet:
+        """ Flashbacks whose nsfw check is queued, polled or lost by its worker and due now. """
+        from event.models import FlashbackNsfwState
+        return self.filter(
+            nsfw_state__in=FlashbackNsfwState.pending(),
+            nsfw_next_check_at__lte=timezone.now(),
+        )
+
+    def processing_orphaned(self, grace_seconds: int) -> models.QuerySet:
+        """ Flashbacks whose processing was never started (or was released for a retry) or whose lease expired. """
+        from event.models import FlashbackProcessingState
+        now = timezone.now()
+        return self.filter(
+            models.Q(
+                processing_state=FlashbackProcessingState.PENDING,
+                created_at__lt=now - timezone.timedelta(seconds=grace_seconds)
+            )
+            | models.Q(processing_state=FlashbackProcessingState.PROCESSING, processing_lease_until__lt=now)
+        )
+
     def first_unseen(self):
         return self.filter(seen=False).order_by("created_at").first()
\ No newline at end of file
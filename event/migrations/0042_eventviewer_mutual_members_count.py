@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0041_alter_flashbackvideochecknsfwjob_flashback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventviewer',
+            name='mutual_members_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
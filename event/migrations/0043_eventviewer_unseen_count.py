@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unseen_flashbacks(apps, schema_editor):
+    EventViewer = apps.get_model("event", "EventViewer")
+    FlashbackViewer = apps.get_model("event", "FlashbackViewer")
+
+    unseen = FlashbackViewer.objects.filter(
+        event_viewer=OuterRef("pk"), is_seen=False
+    ).order_by().values("event_viewer").annotate(count=Count("pk")).values("count")
+    EventViewer.objects.update(unseen_count=Coalesce(Subquery(unseen), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0042_eventviewer_mutual_members_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventviewer',
+            name='unseen_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_unseen_flashbacks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0043_eventviewer_unseen_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='members',
+            field=models.ManyToManyField(related_name='events', through='event.EventMember', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_at', 'end_at'], name='event_start_at_end_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventmember',
+            index=models.Index(fields=['user', 'event'], name='event_member_user_event_idx'),
+        ),
+    ]
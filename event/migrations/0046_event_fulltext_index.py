@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from utils.fulltext import create_fulltext_index, drop_fulltext_index
+
+
+def create_event_fulltext_index(apps, schema_editor):
+    create_fulltext_index(schema_editor, "event_event", ["title", "emoji"])
+
+
+def drop_event_fulltext_index(apps, schema_editor):
+    drop_fulltext_index(schema_editor, "event_event")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0045_event_end_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_event_fulltext_index, drop_event_fulltext_index),
+    ]
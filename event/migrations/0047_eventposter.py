@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:24
+
+import backend.storage_backends
+import django.db.models.deletion
+import event.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0046_event_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventPoster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('status', models.IntegerField(choices=[(0, 'pending'), (1, 'done'), (2, 'failed')], default=0)),
+                ('file', models.FileField(blank=True, default=None, null=True, storage=backend.storage_backends.PrivateMediaStorage(), upload_to=event.models.upload_poster_to)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('color_palette', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='event.eventpostertemplatecolorpalette')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posters', to='event.event')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='event.eventpostertemplate')),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+def mark_processed_flashbacks_done(apps, schema_editor):
+    Flashback = apps.get_model("event", "Flashback")
+    Flashback.objects.filter(is_processed=True).update(processing_state=2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0047_eventposter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashback',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='flashback',
+            name='processing_lease_until',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='flashback',
+            name='processing_state',
+            field=models.IntegerField(choices=[(0, 'pending'), (1, 'processing'), (2, 'done'), (3, 'failed')], default=0),
+        ),
+        migrations.RunPython(mark_processed_flashbacks_done, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flashback',
+            index=models.Index(condition=models.Q(('processing_state__in', [0, 1])), fields=['processing_state', 'created_at'], name='flashback_processing_idx'),
+        ),
+    ]
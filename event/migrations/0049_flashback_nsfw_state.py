@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:27
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_nsfw_checks(apps, schema_editor):
+    Flashback = apps.get_model("event", "Flashback")
+    Flashback.objects.filter(is_nsfw__isnull=False).update(nsfw_state=3)
+    Flashback.objects.filter(is_nsfw__isnull=True, is_processed=True).update(nsfw_next_check_at=timezone.now())
+    Flashback.objects.filter(is_nsfw__isnull=True, nsfw_job__isnull=False).update(nsfw_state=2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0048_flashback_processing_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashback',
+            name='nsfw_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='flashback',
+            name='nsfw_next_check_at',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='flashback',
+            name='nsfw_state',
+            field=models.IntegerField(choices=[(0, 'queued'), (1, 'in flight'), (2, 'awaiting video job'), (3, 'done'), (4, 'failed')], default=0),
+        ),
+        migrations.RunPython(schedule_nsfw_checks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flashback',
+            index=models.Index(condition=models.Q(('nsfw_state__in', [0, 1, 2])), fields=['nsfw_state', 'nsfw_next_check_at'], name='flashback_nsfw_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0049_flashback_nsfw_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashback',
+            name='processing_error',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0050_flashback_processing_error'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='flashback',
+            name='flashback_nsfw_due_idx',
+        ),
+        migrations.AlterField(
+            model_name='flashback',
+            name='nsfw_state',
+            field=models.IntegerField(choices=[(0, 'queued'), (1, 'in flight'), (2, 'awaiting video job'), (3, 'done'), (4, 'failed'), (5, 'claimed')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='flashback',
+            index=models.Index(condition=models.Q(('nsfw_state__in', [0, 5, 1, 2])), fields=['nsfw_state', 'nsfw_next_check_at'], name='flashback_nsfw_due_idx'),
+        ),
+    ]
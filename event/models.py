@@ -1,26 +1,40 @@
 import uuid
 import random
-import segno
-import io
-import weasyprint
-import base64
+import hashlib
+import logging
 from enum import Enum
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
-from django.template.loader import render_to_string
+from django.core.files.base import ContentFile
 from django.conf import settings
 
-from event.managers import EventQuerySet, FlashbackQuerySet
+from event.managers import EventQuerySet, EventViewerQuerySet, FlashbackQuerySet
 from event.validators import hex_color_validator
+from event.qrcodes import get_qrcode, get_qrcode_data_uri
+from event.poster import get_renderer, get_template_mtime
 from user.models import User
 from utils import colors
-from utils.nsfw_detection import get_video_moderation_results
-from utils.media import generate_video_thumbnail
+from utils.cache import read_through, invalidate
+from utils.pagination import rank_key
+from utils.nsfw_detection import get_moderation_backend
+from utils.media import generate_video_thumbnail, ThumbnailError
 from backend.storage_backends import PrivateMediaStorage
 
 
+logger = logging.getLogger(__name__)
+
 EVENT_PREVIEW_COUNT_MAX = 3
+POSTER_EVENT_FIELDS = ("pk", "title")  # event fields the poster templates render
+POSTER_RENDER_TIMEOUT = 60 * 5
+VIEWERS_BATCH_SIZE = 500
+FLASHBACK_VIEWERS_BATCH_SIZE = 2000
+FLASHBACK_PROCESSING_LEASE = 60 * 5
+FLASHBACK_PROCESSING_MAX_ATTEMPTS = 3
+NSFW_CHECK_LEASE = 60 * 5
+NSFW_CHECK_BACKOFF_BASE = 10
+NSFW_CHECK_BACKOFF_MAX = 60 * 60
+NSFW_CHECK_MAX_ATTEMPTS = 40
 
 
 """ Enums and choices """
@@ -59,6 +73,16 @@ class Event(models.Model):
         max_digits=5, decimal_places=2, default=None, null=True)
     allow_nsfw = models.BooleanField(default=False)
 
+    members = models.ManyToManyField(
+        User, through="EventMember", through_fields=("event", "user"), related_name="events"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["start_at", "end_at"], name="event_start_at_end_at_idx"),
+            models.Index(fields=["end_at", "id"], name="event_end_at_id_idx"),
+        ]
+
     def __str__(self) -> str:
         return f"{self.pk}:{self.title}"
 
@@ -98,33 +122,67 @@ class Event(models.Model):
 
     def close(self):
         self.end_at = timezone.now()
+        self.post_close_actions = True  # check_event_status would run on_close again
         self.save()
         self.on_close()
 
     def on_close(self):
-        self.generate_viewers()
+        self.generate_viewers()  # viewers created for a closed event get its flashbacks
         self.generate_preview()
 
     @property
     def flashbacks(self):
-        return Flashback.objects.filter(
-            event_member_id__in=(ev.id for ev in EventMember.objects.filter(event=self))
-        )
+        return Flashback.objects.filter(event_member__event=self)
 
     @property
     def invite_code(self):
         instance, _ = EventInviteCode.objects.get_or_create(event=self)
         return instance
 
+    def invalidate_posters(self):
+        """ Deletes posters rendered from a previous version of the event. """
+        stale = [
+            poster.pk for poster in self.posters.select_related("template", "color_palette")
+            if poster.key != poster.template.get_poster_key(self, poster.color_palette)
+        ]
+        if stale:
+            EventPoster.objects.filter(pk__in=stale).delete()
+
     def get_friends_members(self, user: User) -> models.QuerySet["EventMember"]:
-        return self.eventmember_set.filter(
-            user__in=[u.get_friend(user).pk for u in user.friendship_set.all()]
-        )
+        return self.eventmember_set.filter(user__friend_edges__user=user)
+
+    def get_possible_members(self, search: str = None) -> models.QuerySet[User]:
+        """
+        Friends of the members annotated with their EventMemberStatus as "member_status",
+        the count of members they are friends with as "members_friends_count"
+        and "possible_rank", the unique cursor position ranking them by that count.
+        """
+        from event.status import EventMemberStatus
+
+        users = User.objects.filter(friend_edges__user__in=self.eventmember_set.values("user"))
+        if search:
+            users = users.filter(username__istartswith=search)
+        return users.annotate(
+            members_friends_count=models.Count("friend_edges"),
+            member_status=models.Case(
+                models.When(
+                    models.Exists(self.eventmember_set.filter(user=models.OuterRef("pk"))),
+                    then=models.Value(EventMemberStatus.MEMBER.value)
+                ),
+                models.When(
+                    models.Exists(self.eventinvite_set.filter(user=models.OuterRef("pk"))),
+                    then=models.Value(EventMemberStatus.INVITED.value)
+                ),
+                default=models.Value(EventMemberStatus.NONE.value),
+            ),
+        ).annotate(possible_rank=rank_key("members_friends_count", "username"))
 
     def save(self, *args, **kwargs):
         if self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value:
             if self.mutual_friends_limit is None:
                 self.mutual_friends_limit = 0.3
+        if hasattr(self, "current_status"):  # keep EventQuerySet.with_status annotation in sync
+            self.current_status = self.status.value
         super().save(*args, **kwargs)
 
     def generate_preview(self):
@@ -149,45 +207,136 @@ class Event(models.Model):
             flashbacks = flashbacks.exclude(pk=random_flashback.pk)
             EventPreview.objects.create(event=self, flashback=random_flashback, order=i + 1 + ep_count)
 
-    def generate_viewers(self):
-        self._flush_viewers()
-        self._generate_all_members_viewers()  # members should be always viewers
+    @property
+    def viewers_friends_threshold(self) -> int | None:
+        return self.get_viewers_friends_threshold(self.eventmember_set.count())
+
+    def get_viewers_friends_threshold(self, members_count: int) -> int | None:
+        """
+        Minimal count of members a non member has to be friends with to become a viewer,
+        None when the event is visible only to its members.
+        """
+        if self.viewers_mode == EventViewersMode.ALL_FRIENDS.value:
+            return 1
+        if self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value:
+            if self.mutual_friends_limit >= 1:
+                return 1
+            return round(members_count * ((self.mutual_friends_limit * 10) / 100)) + 1
+        return None
+
+    def get_viewers_map(self, user_ids=None) -> dict[int, "EventViewer"]:
+        """
+        Maps id of every user who should view the event to unsaved EventViewer,
+        user_ids limits the map only to these users.
+        """
+        from friendship.models import FriendshipEdge
+
+        members = self.eventmember_set.values("user_id")
+        members_to_view = members if user_ids is None else members.filter(user_id__in=user_ids)
+        viewers = {  # members should be always viewers
+            em["user_id"]: EventViewer(event=self, user_id=em["user_id"], is_member=True)
+            for em in members_to_view
+        }
 
-        if (self.viewers_mode == EventViewersMode.ALL_FRIENDS.value or
-           (self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value and self.mutual_friends_limit >= 1)):
-            self._generate_all_friends_viewers()  # mode is ALL_FRIENDS or MUTUAL_FRIENDS with mfl over 1
+        threshold = self.viewers_friends_threshold
+        if threshold is None:
+            return viewers
 
-        elif self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value:
-            self._generate_mutual_members_viewers()  # MUTUAL_FRIENDS
+        friends = FriendshipEdge.objects.friends_of(members).filter(users_count__gte=threshold)
+        if user_ids is not None:
+            friends = friends.filter(friend__in=user_ids)
 
-    def _generate_all_members_viewers(self):
-        for em in self.eventmember_set.all():
-            EventViewer.objects.get_or_create(
-                user=em.user, event=self, is_member=True
+        for f in friends:
+            viewers[f["friend"]] = EventViewer(
+                event=self, user_id=f["friend"], is_member=False, mutual_members_count=f["users_count"]
             )
+        return viewers
 
-    def _generate_all_friends_viewers(self):
-        for em in self.eventmember_set.all():
-            for f in em.user.friends:
-                EventViewer.objects.get_or_create(
-                    user=f, event=self, is_member=False
+    def generate_viewers(self):
+        self.sync_viewers()
+
+    def sync_viewers(self, user_ids=None):
+        """
+        Brings EventViewer rows of the event in line with its members and their friends,
+        only rows which differ are touched. user_ids limits the sync only to these users.
+        """
+        viewers = self.get_viewers_map(user_ids)
+        existing = EventViewer.objects.filter(event=self).only("id", "user_id", "is_member", "mutual_members_count")
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+        existing = {ev.user_id: ev for ev in existing}
+
+        to_create, to_update, to_delete = [], [], []
+        for user_id, viewer in viewers.items():
+            ev = existing.get(user_id)
+            if ev is None:
+                to_create.append(viewer)
+            elif (ev.is_member, ev.mutual_members_count) != (viewer.is_member, viewer.mutual_members_count):
+                ev.is_member, ev.mutual_members_count = viewer.is_member, viewer.mutual_members_count
+                to_update.append(ev)
+        for user_id, ev in existing.items():
+            if user_id not in viewers:
+                to_delete.append(ev.id)
+
+        with transaction.atomic():
+            if to_delete:
+                EventViewer.objects.filter(id__in=to_delete).delete()
+            if to_update:
+                EventViewer.objects.bulk_update(
+                    to_update, ["is_member", "mutual_members_count"], batch_size=VIEWERS_BATCH_SIZE
                 )
+            if to_create:
+                EventViewer.objects.bulk_create(to_create, batch_size=VIEWERS_BATCH_SIZE)
+                if self.status == EventStatus.CLOSED:  # flashbacks are already shared, the new viewers get them too
+                    self.generate_flashback_viewers(viewers=EventViewer.objects.filter(
+                        event=self, user_id__in=[viewer.user_id for viewer in to_create]
+                    ))
+                # bulk_create sends no signals to invalidate viewer ids
+                transaction.on_commit(lambda: invalidate("event", self.pk))
+
+    def generate_flashback_viewers(self, viewers=None):
+        """
+        Creates missing FlashbackViewer for every viewer (all by default) and flashback of the event,
+        all of them are marked as unseen.
+        """
+        if viewers is None:
+            viewers = EventViewer.objects.filter(event=self)
+        viewers_id = list(viewers.values_list("id", flat=True))
+        flashbacks_id = list(self.flashbacks.values_list("id", flat=True))
+
+        with transaction.atomic():
+            FlashbackViewer.objects.filter(event_viewer_id__in=viewers_id, is_seen=True).update(is_seen=False)
+
+            batch = []
+            for event_viewer_id in viewers_id:
+                for flashback_id in flashbacks_id:
+                    batch.append(FlashbackViewer(event_viewer_id=event_viewer_id, flashback_id=flashback_id))
+                    if len(batch) >= FLASHBACK_VIEWERS_BATCH_SIZE:
+                        FlashbackViewer.objects.bulk_create(batch, ignore_conflicts=True)
+                        batch = []
+            if batch:
+                FlashbackViewer.objects.bulk_create(batch, ignore_conflicts=True)
+
+            EventViewer.objects.filter(id__in=viewers_id).update_unseen_count()
+
+    def on_member_changed(self, user_id: int, joined: bool):
+        """ Updates only the viewers affected by the user joining or leaving the event. """
+        from friendship.models import FriendshipEdge
+
+        if not self.viewers_generated:
+            return
 
-    def _generate_mutual_members_viewers(self):
-        members_count = len(self.eventmember_set)
-        mutual_friends_limit_c = round(members_count * ((self.mutual_friends_limit * 10) / 100))
-        user_friends_count = {}
-        for em in self.eventmember_set.all():
-            for f in em.user.friends:
-                mfc = user_friends_count.get(f.pk, 0)
-                if mfc is True: continue
-                user_friends_count[f.pk] = mfc + 1
-                if mfc >= mutual_friends_limit_c:
-                    EventViewer.objects.get_or_create(user=f, event=self, is_member=False)
-                    user_friends_count[f.pk] = True
+        members_count = self.eventmember_set.count()
+        threshold = self.get_viewers_friends_threshold(members_count)
+        members_count_before = members_count - 1 if joined else members_count + 1
+        if threshold != self.get_viewers_friends_threshold(members_count_before):
+            self.sync_viewers()  # threshold moved, any friend of members can be affected
+            return
 
-    def _flush_viewers(self):
-        EventViewer.objects.filter(event=self).delete()
+        user_ids = {user_id}
+        if threshold is not None:
+            user_ids.update(FriendshipEdge.objects.filter(user_id=user_id).values_list("friend_id", flat=True))
+        self.sync_viewers(user_ids)
 
 
 class EventInviteStatus(models.IntegerChoices):
@@ -231,6 +380,9 @@ class EventMember(models.Model):
 
     class Meta:
         unique_together = ("event", "user")
+        indexes = [
+            models.Index(fields=["user", "event"], name="event_member_user_event_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user} -{self.role}-> {self.event}"
@@ -246,6 +398,26 @@ class FlashbackMediaType(models.IntegerChoices):
     VIDEO = 1, "video"
 
 
+class FlashbackProcessingState(models.IntegerChoices):
+    PENDING = 0, "pending"
+    PROCESSING = 1, "processing"
+    DONE = 2, "done"
+    FAILED = 3, "failed"
+
+
+class FlashbackNsfwState(models.IntegerChoices):
+    QUEUED = 0, "queued"
+    IN_FLIGHT = 1, "in flight"
+    AWAITING_VIDEO_JOB = 2, "awaiting video job"
+    DONE = 3, "done"
+    FAILED = 4, "failed"
+    CLAIMED = 5, "claimed"  # check task enqueued, not started yet
+
+    @classmethod
+    def pending(cls) -> list["FlashbackNsfwState"]:
+        return [cls.QUEUED, cls.CLAIMED, cls.IN_FLIGHT, cls.AWAITING_VIDEO_JOB]
+
+
 class Flashback(models.Model):
     objects = FlashbackQuerySet.as_manager()
 
@@ -255,6 +427,12 @@ class Flashback(models.Model):
 
     media_type = models.IntegerField(default=FlashbackMediaType.PHOTO, choices=FlashbackMediaType.choices)
     is_processed = models.BooleanField(default=False)
+    processing_state = models.IntegerField(
+        default=FlashbackProcessingState.PENDING, choices=FlashbackProcessingState.choices
+    )
+    processing_lease_until = models.DateTimeField(null=True, blank=True, default=None)
+    processing_attempts = models.PositiveSmallIntegerField(default=0)
+    processing_error = models.CharField(max_length=16, blank=True, default="")  # ThumbnailError reason of the last attempt
 
     media = models.ImageField(
         upload_to=upload_flashback_to, blank=True, null=True, default=None, storage=PrivateMediaStorage(),
@@ -264,6 +442,23 @@ class Flashback(models.Model):
     )
 
     is_nsfw = models.BooleanField(null=True, blank=True, default=None)
+    nsfw_state = models.IntegerField(default=FlashbackNsfwState.QUEUED, choices=FlashbackNsfwState.choices)
+    nsfw_next_check_at = models.DateTimeField(null=True, blank=True, default=None)  # lease end while in flight
+    nsfw_attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["nsfw_state", "nsfw_next_check_at"], name="flashback_nsfw_due_idx",
+                condition=models.Q(nsfw_state__in=FlashbackNsfwState.pending()),
+            ),
+            models.Index(
+                fields=["processing_state", "created_at"], name="flashback_processing_idx",
+                condition=models.Q(processing_state__in=[
+                    FlashbackProcessingState.PENDING, FlashbackProcessingState.PROCESSING
+                ]),
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.event_member} flashback [{self.id}]"
@@ -284,33 +479,197 @@ class Flashback(models.Model):
     def event(self) -> Event:
         return self.event_member.event
 
-    def process_media(self):
-        if self.media_type == FlashbackMediaType.VIDEO:
-            self._process_video_media()
-        elif self.media_type == FlashbackMediaType.PHOTO:
-            self._process_photo_media()
+    def claim_processing(self) -> bool:
+        """
+        Takes the processing lease, False when the flashback is processed, failed
+        or leased by another worker whose lease has not expired yet.
+        """
+        now = timezone.now()
+        claimed = Flashback.objects.filter(pk=self.pk).filter(
+            models.Q(processing_state=FlashbackProcessingState.PENDING)
+            | models.Q(processing_state=FlashbackProcessingState.PROCESSING, processing_lease_until__lt=now)
+        ).update(
+            processing_state=FlashbackProcessingState.PROCESSING,
+            processing_lease_until=now + timezone.timedelta(seconds=FLASHBACK_PROCESSING_LEASE),
+            processing_attempts=models.F("processing_attempts") + 1,
+        )
+        if claimed:
+            self.refresh_from_db(fields=["processing_state", "processing_lease_until", "processing_attempts"])
+        return bool(claimed)
+
+    def release_processing(self, processed: bool, retryable: bool = True):
+        if processed:
+            self.processing_state = FlashbackProcessingState.DONE
+        elif not retryable or self.processing_attempts >= FLASHBACK_PROCESSING_MAX_ATTEMPTS:
+            self.processing_state = FlashbackProcessingState.FAILED
+        else:  # retried by the sweeper
+            self.processing_state = FlashbackProcessingState.PENDING
+        self.is_processed = processed
+        self.processing_lease_until = None
+        if processed:  # nsfw check is due as soon as the media is ready
+            self.nsfw_next_check_at = timezone.now()
+        self.save(update_fields=[
+            "processing_state", "is_processed", "processing_lease_until", "processing_error", "nsfw_next_check_at"
+        ])
+
+    def claim_nsfw_check(self) -> int | None:
+        """
+        Takes the nsfw check lease when the check is due, None when it is not due or leased by someone else.
+        Returns the lease token, the attempt number the check task gets to start the check with.
+        """
+        now = timezone.now()
+        attempt = Flashback.objects.filter(pk=self.pk).values_list("nsfw_attempts", flat=True).first()
+        if attempt is None:
+            return None
+        claimed = Flashback.objects.filter(
+            pk=self.pk,
+            nsfw_state__in=FlashbackNsfwState.pending(),
+            nsfw_next_check_at__lte=now,
+            nsfw_attempts=attempt,
+        ).update(
+            nsfw_state=FlashbackNsfwState.CLAIMED,
+            nsfw_next_check_at=now + timezone.timedelta(seconds=NSFW_CHECK_LEASE),
+            nsfw_attempts=attempt + 1,
+        )
+        return attempt + 1 if claimed else None
+
+    def start_nsfw_check(self, lease: int) -> bool:
+        """ Moves the claimed check in flight, only one delivery of the check task gets through per lease. """
+        started = Flashback.objects.filter(
+            pk=self.pk, nsfw_state=FlashbackNsfwState.CLAIMED, nsfw_attempts=lease
+        ).update(
+            nsfw_state=FlashbackNsfwState.IN_FLIGHT,
+            nsfw_next_check_at=timezone.now() + timezone.timedelta(seconds=NSFW_CHECK_LEASE),
+        )
+        if started:
+            self.nsfw_state, self.nsfw_attempts = FlashbackNsfwState.IN_FLIGHT, lease
+        return bool(started)
+
+    def _release_nsfw_check(self, **fields) -> bool:
+        """ Writes the outcome of the check while its lease is held, a check claimed again meanwhile wins. """
+        return bool(Flashback.objects.filter(
+            pk=self.pk, nsfw_state=FlashbackNsfwState.IN_FLIGHT, nsfw_attempts=self.nsfw_attempts
+        ).update(**fields))
+
+    def check_nsfw(self, lease: int):
+        """ Runs the claimed nsfw check, videos are checked through a moderation job polled with backoff. """
+        if not self.start_nsfw_check(lease):
+            return
 
-    def _process_photo_media(self):
-        self.is_processed = True
-        self.save()
+        if self.media_type == FlashbackMediaType.PHOTO:
+            Flashback.check_photos_nsfw([self])
+            return
 
-    def _process_video_media(self):
-        if self.media_type != FlashbackMediaType.VIDEO:
+        if not self.video_media:
+            self.schedule_nsfw_check(FlashbackNsfwState.FAILED)
+            return
+        try:
+            self._check_video_nsfw()
+        except Exception:
+            self.retry_nsfw_check()
+            raise
+
+    @classmethod
+    def check_photos_nsfw(cls, flashbacks: list["Flashback"]):
+        """ Runs the started nsfw checks of photo flashbacks, the moderation backend checks them concurrently. """
+        to_check = []
+        for flashback in flashbacks:
+            if flashback.nsfw_state != FlashbackNsfwState.IN_FLIGHT:
+                continue
+            if not flashback.media:
+                flashback.schedule_nsfw_check(FlashbackNsfwState.FAILED)
+                continue
+            to_check.append(flashback)
+        if not to_check:
             return
 
-        if self._generate_media_for_video():
-            self.is_processed = True
-            self.save()
+        results = get_moderation_backend().check_photos([flashback.media_key for flashback in to_check])
+        for flashback, result in zip(to_check, results):
+            if isinstance(result, Exception):
+                logger.warning("nsfw check of %s failed: %r", flashback, result)
+                flashback.retry_nsfw_check()
+            else:
+                _, is_nsfw = result
+                flashback.set_nsfw_result(is_nsfw)
+
+    def retry_nsfw_check(self):
+        """ Retried with backoff until NSFW_CHECK_MAX_ATTEMPTS, a video job already started is polled again. """
+        self.schedule_nsfw_check(
+            FlashbackNsfwState.QUEUED if self.nsfw_attempts < NSFW_CHECK_MAX_ATTEMPTS else FlashbackNsfwState.FAILED
+        )
+
+    def _check_video_nsfw(self):
+        job = FlashbackVideoCheckNsfwJob.objects.filter(flashback=self).first()
+        if job is None:
+            FlashbackVideoCheckNsfwJob.objects.create(
+                flashback=self, job_id=get_moderation_backend().start_video_moderation(self.video_media_key)
+            )
+            self.schedule_nsfw_check(FlashbackNsfwState.AWAITING_VIDEO_JOB)
+            return
+
+        if not job.is_valid:
+            job.delete()
+            self.schedule_nsfw_check(FlashbackNsfwState.FAILED)
+            return
+
+        _, is_nsfw = job.load_result()
+        if is_nsfw is None:
+            self.schedule_nsfw_check(FlashbackNsfwState.AWAITING_VIDEO_JOB)
+            return
+        if self.set_nsfw_result(is_nsfw):
+            job.delete()
+
+    def schedule_nsfw_check(self, state: int) -> bool:
+        """ Releases the lease, the next check is due after an exponential backoff unless the state is final. """
+        if state in (FlashbackNsfwState.DONE, FlashbackNsfwState.FAILED):
+            next_check_at = None
+        else:
+            backoff = NSFW_CHECK_BACKOFF_BASE * 2 ** max(self.nsfw_attempts - 1, 0)
+            next_check_at = timezone.now() + timezone.timedelta(seconds=min(backoff, NSFW_CHECK_BACKOFF_MAX))
+        if not self._release_nsfw_check(nsfw_state=state, nsfw_next_check_at=next_check_at):
+            return False
+        self.nsfw_state, self.nsfw_next_check_at = state, next_check_at
+        return True
+
+    def set_nsfw_result(self, is_nsfw: bool) -> bool:
+        if not self._release_nsfw_check(is_nsfw=is_nsfw, nsfw_state=FlashbackNsfwState.DONE, nsfw_next_check_at=None):
+            return False
+        self.is_nsfw, self.nsfw_state, self.nsfw_next_check_at = is_nsfw, FlashbackNsfwState.DONE, None
+        if is_nsfw:
+            self.switch_nsfw_preview()
+        return True
+
+    def switch_nsfw_preview(self):
+        """ Nsfw flashbacks are not event previews. """
+        preview = EventPreview.objects.filter(flashback=self).first()
+        if preview is not None:
+            preview.switch_flashback_random()
+
+    def process_media(self):
+        """ Processes the media once, calls are no-ops while another worker holds the lease. """
+        if not self.claim_processing():
+            return
+
+        processed, retryable = False, True
+        self.processing_error = ""
+        try:
+            if self.media_type == FlashbackMediaType.VIDEO:
+                processed = self._generate_media_for_video()
+            elif self.media_type == FlashbackMediaType.PHOTO:
+                processed = True
+        except ThumbnailError as e:
+            logger.warning("thumbnail of flashback %s failed: %s", self.pk, e)
+            self.processing_error, retryable = e.reason, e.retryable
+        finally:
+            self.release_processing(processed, retryable)
 
     def _generate_media_for_video(self):
         if self.media_type != FlashbackMediaType.VIDEO or not self.video_media:
             return False
         image = generate_video_thumbnail(self.video_media_key)
-        if image:
-            self.media.save(image.name, image)
-            self.save()
-            return True
-        return False
+        self.media.save(image.name, image, save=False)
+        self.save(update_fields=["media"])
+        return True
 
 
 class FlashbackVideoCheckNsfwJob(models.Model):
@@ -326,7 +685,7 @@ class FlashbackVideoCheckNsfwJob(models.Model):
         return timezone.now() - self.created_at < timezone.timedelta(days=1)
 
     def load_result(self):
-        return get_video_moderation_results(self.job_id)
+        return get_moderation_backend().get_video_moderation_results(self.job_id)
 
 
 class EventPreview(models.Model):
@@ -361,10 +720,14 @@ class EventPreview(models.Model):
 
 
 class EventViewer(models.Model):
+    objects = EventViewerQuerySet.as_manager()
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     is_member = models.BooleanField(default=False)
     is_opened = models.BooleanField(default=False)
+    mutual_members_count = models.PositiveIntegerField(default=0)  # members the viewer is friends with, 0 for members
+    unseen_count = models.PositiveIntegerField(default=0)  # flashbacks the viewer has not seen yet
 
     class Meta:
         unique_together = ("user", "event")
@@ -373,12 +736,14 @@ class EventViewer(models.Model):
         return f"user:[{self.user}] -> event:[{self.event}]"
 
     def generate_flashback_viewer(self):
-        for user in self.event.eventmember_set.all():
-            for flashback in user.flashback_set.all():
-                fv, created = FlashbackViewer.objects.get_or_create(event_viewer=self, flashback=flashback)
-                if not created and fv.is_seen:
-                    fv.is_seen = False
-                    fv.save()
+        self.event.generate_flashback_viewers(viewers=EventViewer.objects.filter(pk=self.pk))
+
+    @classmethod
+    def get_user_ids(cls, event_id: int) -> set[int]:
+        """ Ids of the viewers of the event, cached per event. """
+        return read_through("event", event_id, "viewer_ids", lambda: set(
+            cls.objects.filter(event_id=event_id).values_list("user_id", flat=True)
+        ))
 
 
 class FlashbackViewer(models.Model):
@@ -392,6 +757,13 @@ class FlashbackViewer(models.Model):
     def __str__(self):
         return f"[{self.event_viewer}] -> {self.flashback}"
 
+    def mark_as_seen(self):
+        if FlashbackViewer.objects.filter(pk=self.pk, is_seen=False).update(is_seen=True):
+            EventViewer.objects.filter(pk=self.event_viewer_id, unseen_count__gt=0).update(
+                unseen_count=models.F("unseen_count") - 1
+            )
+        self.is_seen = True
+
 
 def generate_event_qrcode_code():
     return uuid.uuid4().hex[:8]
@@ -408,15 +780,12 @@ class EventInviteCode(models.Model):
     def link(self):
         return f"{settings.DOMAIN}/event/invite?code={self.code}"
 
-    def generate_qrcode(self, front_color="#ffffff", background_color="#000000") -> str:
-        qrcode = segno.make(self.link, mask=7)
-        buffer = io.BytesIO()
-        qrcode.save(buffer, kind='png', scale=7, dark=front_color, light=background_color, border=1)
-
-        # Get the image data as base64 encoded string
-        qr_code_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    def get_qrcode(self, kind="png", front_color="#ffffff", background_color="#000000") -> bytes:
+        return get_qrcode(self.link, kind=kind, dark=front_color, light=background_color)
 
-        return f"data:image/png;base64,{qr_code_base64}"
+    def generate_qrcode(self, front_color="#ffffff", background_color="#000000") -> str:
+        """ QR code as a data URI, for templates. """
+        return get_qrcode_data_uri(self.link, kind="png", dark=front_color, light=background_color)
 
     def add_member(self, user):
         self.event.add_member_from_invite_code(user)
@@ -430,21 +799,20 @@ class EventPosterTemplate(models.Model):
         return self.title
 
     def render_html(self, event, color_palette: "EventPosterTemplateColorPalette"):
-        context = {
-            "event": event,
-            "palette": color_palette,
-        }
-
-        return render_to_string(
-            f"event/poster/{self.html_file}", context=context,
-        )
+        return get_renderer(self.html_file).render_html(event, color_palette)
 
     def render_pdf(self, event, color_palette: "EventPosterTemplateColorPalette"):
-        return weasyprint.HTML(string=self.render_html(event, color_palette)).write_pdf(
-            stylesheets=[
-                weasyprint.CSS(string='@page { size: A4; margin: 0; }')
-            ]
-        )
+        return get_renderer(self.html_file).render_pdf(event, color_palette)
+
+    def get_poster_key(self, event, color_palette: "EventPosterTemplateColorPalette") -> str:
+        """ Hash of everything the rendered poster depends on. """
+        parameters = [
+            self.html_file, get_template_mtime(self.html_file),
+            color_palette.color, color_palette.light_color,
+            *[getattr(event, field) for field in POSTER_EVENT_FIELDS],
+            event.invite_code.code,
+        ]
+        return hashlib.sha256("|".join(map(str, parameters)).encode("utf-8")).hexdigest()
 
 
 class EventPosterTemplateColorPalette(models.Model):
@@ -461,3 +829,45 @@ class EventPosterTemplateColorPalette(models.Model):
     def generate_colors(self):
         self.light_color = colors.generate_light_color(self.color)
         self.save()
+
+
+def upload_poster_to(instance, filename):
+    return f"poster/{instance.key}.pdf"
+
+
+class EventPosterStatus(models.IntegerChoices):
+    PENDING = 0, "pending"
+    DONE = 1, "done"
+    FAILED = 2, "failed"
+
+
+class EventPoster(models.Model):
+    """ PDF poster rendered by the render_poster task, looked up by its content key. """
+    key = models.CharField(max_length=64, unique=True)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="posters")
+    template = models.ForeignKey(EventPosterTemplate, on_delete=models.CASCADE)
+    color_palette = models.ForeignKey(EventPosterTemplateColorPalette, on_delete=models.CASCADE)
+    status = models.IntegerField(choices=EventPosterStatus.choices, default=EventPosterStatus.PENDING)
+    file = models.FileField(upload_to=upload_poster_to, blank=True, null=True, default=None, storage=PrivateMediaStorage())
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.template} poster of {self.event} [{self.get_status_display()}]"
+
+    @property
+    def is_stale(self) -> bool:
+        """ Pending for too long, the render task was lost. """
+        return self.status == EventPosterStatus.PENDING and \
+            self.updated_at < timezone.now() - timezone.timedelta(seconds=POSTER_RENDER_TIMEOUT)
+
+    def render(self):
+        try:
+            pdf = self.template.render_pdf(self.event, self.color_palette)
+        except Exception:
+            self.status = EventPosterStatus.FAILED
+            EventPoster.objects.filter(pk=self.pk).update(status=self.status, updated_at=timezone.now())
+            raise
+
+        name = self.file.storage.save(upload_poster_to(self, None), ContentFile(pdf))
+        if not EventPoster.objects.filter(pk=self.pk).update(file=name, status=EventPosterStatus.DONE):
+            self.file.storage.delete(name)  # invalidated while rendering
@@ -0,0 +1,91 @@
+import os
+import threading
+from functools import lru_cache
+
+import weasyprint
+from weasyprint.text.fonts import FontConfiguration
+from weasyprint.urls import URLFetcherResponse
+from django.conf import settings
+from django.template.loader import get_template
+
+PAGE_CSS = "@page { size: A4; margin: 0; }"
+
+
+class MemoryURLFetcher(weasyprint.URLFetcher):
+    """ Keeps every fetched asset (fonts, images, stylesheets) in memory for the next renders, data URIs excepted. """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, url, headers=None):
+        if url.startswith("data:"):
+            return super().fetch(url, headers)
+
+        asset = self._assets.get(url)
+        if asset is None:
+            with self._lock:
+                response = super().fetch(url, headers)
+                try: asset = (response.url, response.read(), dict(response.headers.items()), response.status)
+                finally: response.close()
+                self._assets[url] = asset
+        url, body, headers, status = asset
+        return URLFetcherResponse(url, body, headers, status)
+
+
+@lru_cache(maxsize=None)
+def get_font_config() -> FontConfiguration:
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def get_url_fetcher() -> MemoryURLFetcher:
+    return MemoryURLFetcher()
+
+
+def get_template_name(html_file: str) -> str:
+    return f"event/poster/{html_file}"
+
+
+def _read_template_mtime(html_file: str) -> float:
+    return os.path.getmtime(get_template(get_template_name(html_file)).origin.name)
+
+
+_read_template_mtime_once = lru_cache(maxsize=None)(_read_template_mtime)
+
+
+def get_template_mtime(html_file: str) -> float:
+    """ Modification time of the template file, looked up once per process unless DEBUG reloads templates. """
+    return _read_template_mtime(html_file) if settings.DEBUG else _read_template_mtime_once(html_file)
+
+
+class PosterRenderer:
+    """ Poster template compiled once per process, a render only substitutes the event context and lays it out. """
+
+    def __init__(self, html_file: str):
+        self.template = get_template(get_template_name(html_file))
+        self.stylesheets = [
+            weasyprint.CSS(string=PAGE_CSS, font_config=get_font_config(), url_fetcher=get_url_fetcher()),
+        ]
+
+    def render_html(self, event, color_palette) -> str:
+        return self.template.render({
+            "event": event,
+            "palette": color_palette,
+        })
+
+    def render_pdf(self, event, color_palette) -> bytes:
+        return weasyprint.HTML(
+            string=self.render_html(event, color_palette), url_fetcher=get_url_fetcher()
+        ).write_pdf(stylesheets=self.stylesheets, font_config=get_font_config())
+
+
+@lru_cache(maxsize=None)
+def _get_renderer(html_file: str, mtime: float) -> PosterRenderer:
+    return PosterRenderer(html_file)
+
+
+def get_renderer(html_file: str) -> PosterRenderer:
+    """ Renderer of the template file, compiled once per process, again when the file changes in DEBUG. """
+    return _get_renderer(html_file, get_template_mtime(html_file))
@@ -0,0 +1,44 @@
+import base64
+import hashlib
+import io
+from functools import lru_cache
+
+import segno
+from django.core.files.base import ContentFile
+
+from backend.storage_backends import PrivateMediaStorage
+
+QRCODE_FOLDER = "event_qrcode"
+QRCODE_SCALE = 7
+QRCODE_MASK = 7
+QRCODE_CACHE_SIZE = 256
+QRCODE_CONTENT_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def get_qrcode_key(content: str, kind: str, dark: str, light: str) -> str:
+    """ Content address of the rendered QR code, every rendering parameter is part of it. """
+    parameters = f"{content}|{kind}|{dark}|{light}|{QRCODE_SCALE}|{QRCODE_MASK}"
+    return hashlib.sha256(parameters.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=QRCODE_CACHE_SIZE)
+def get_qrcode(content: str, kind: str = "png", dark: str = "#ffffff", light: str = "#000000") -> bytes:
+    """ Rendered QR code, looked up in memory then in the storage before rendering it. """
+    storage = PrivateMediaStorage()
+    path = f"{QRCODE_FOLDER}/{get_qrcode_key(content, kind, dark, light)}.{kind}"
+    if storage.exists(path):
+        with storage.open(path) as file:
+            return file.read()
+
+    buffer = io.BytesIO()
+    segno.make(content, mask=QRCODE_MASK).save(buffer, kind=kind, scale=QRCODE_SCALE, dark=dark, light=light, border=1)
+    storage.save(path, ContentFile(buffer.getvalue()))
+    return buffer.getvalue()
+
+
+def get_qrcode_data_uri(content: str, kind: str = "png", dark: str = "#ffffff", light: str = "#000000") -> str:
+    encoded = base64.b64encode(get_qrcode(content, kind, dark, light)).decode("utf-8")
+    return f"data:{QRCODE_CONTENT_TYPES[kind]};base64,{encoded}"
@@ -49,10 +49,12 @@ class EventSerializer(serializers.ModelSerializer):
         return humanize_event_time(obj.start_at)
 
     def get_status(self, obj: models.Event) -> int:
-        return obj.status.value
+        status = getattr(obj, "current_status", None)  # annotated by EventQuerySet.with_status
+        return status if status is not None else obj.status.value
 
     def get_flashbacks_count(self, obj):
-        return obj.flashbacks.count()
+        count = getattr(obj, "flashbacks_count", None)  # annotated by EventQuerySet.with_flashbacks_count
+        return count if count is not None else obj.flashbacks.count()
 
 
 """Viewer Serializers"""
@@ -95,21 +97,28 @@ class EventViewerSerializer(serializers.ModelSerializer):
             "preview",
             "is_member",
             "is_opened",
-            "is_host"
+            "is_host",
+            "unseen_count"
         ]
 
+    # annotations and prefetches come from EventViewerQuerySet.with_feed_data
+
     def get_flashbacks_count(self, obj):
-        return obj.event.flashbacks.count()
+        count = getattr(obj.event, "flashbacks_count", None)
+        return count if count is not None else obj.event.flashbacks.count()
 
     def get_preview(self, obj):
-        return EventPreviewSerializer(
-            instance=obj.event.eventpreview_set.all().order_by("order"),
-            many=True
-        ).data
+        previews = getattr(obj.event, "ordered_previews", None)
+        if previews is None:
+            previews = obj.event.eventpreview_set.all().order_by("order")
+        return EventPreviewSerializer(instance=previews, many=True).data
 
     def get_is_host(self, obj):
         if not obj.is_member:
             return False
+        is_host = getattr(obj, "is_host", None)
+        if is_host is not None:
+            return is_host
         em = models.EventMember.objects.filter(event=obj.event, user=obj.user).first()
         return True if em is not None and em.role == models.EventMemberRole.HOST else False
 
@@ -150,7 +159,7 @@ class FlashbackSerializer(serializers.ModelSerializer):
         return MiniUserSerializer(instance=obj.event_member.user).data
 
     def get_preview_order(self, obj: models.Flashback):
-        preview = obj.eventpreview_set.first()
+        preview = next(iter(obj.eventpreview_set.all()), None)  # works with prefetched previews
         return preview.order if preview is not None else None
 
     def get_show(self, obj: models.Flashback):
@@ -226,6 +235,13 @@ class EventPosterTemplateSerializer(serializers.ModelSerializer):
         ]
 
 
+class PossibleMemberSerializer(MiniUserSerializer):
+    status = serializers.IntegerField(source="member_status", read_only=True)
+
+    class Meta(MiniUserSerializer.Meta):
+        fields = MiniUserSerializer.Meta.fields + ["status"]
+
+
 class EventInviteSerializer(serializers.ModelSerializer):
     user = MiniUserSerializer()
     invited_by = MiniUserSerializer()
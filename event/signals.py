@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
 
 from event import models, tasks
+from friendship.models import Friendship
+from utils.cache import invalidate
 
 
 @receiver(post_save, sender=models.EventInvite)
@@ -24,8 +28,111 @@ def check_for_preview(sender, instance, **kwargs):
 
 @receiver(post_save, sender=models.Flashback)
 def check_for_nsfw_preview(sender, instance, **kwargs):
-    if not instance.is_nsfw:
+    if instance.is_nsfw:
+        instance.switch_nsfw_preview()
+
+
+""" Viewers maintenance """
+
+def _is_direct_delete(origin, model) -> bool:
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+def _sync_event_viewers(event_id: int):
+    event = models.Event.objects.filter(pk=event_id).first()
+    if event is not None and event.viewers_generated:
+        event.generate_viewers()
+
+
+def _sync_friendship_viewers(friendship: Friendship):
+    users = (
+        (friendship.from_user_id, friendship.to_user_id),
+        (friendship.to_user_id, friendship.from_user_id),
+    )
+    for user_id, friend_id in users:
+        events = models.Event.objects.filter(
+            eventmember__user_id=user_id, eventviewer__isnull=False
+        ).exclude(viewers_mode=models.EventViewersMode.ONLY_MEMBERS).distinct()
+        for event in events:
+            event.sync_viewers(user_ids=[friend_id])
+
+
+@receiver(post_save, sender=models.EventMember)
+def event_member_post_save(sender, instance, created, **kwargs):
+    if created:
+        instance.event.on_member_changed(instance.user_id, joined=True)
+
+
+def _update_event_unseen_count(event_id: int):
+    models.EventViewer.objects.filter(event_id=event_id).update_unseen_count()
+
+
+@receiver(post_delete, sender=models.EventMember)
+def event_member_post_delete(sender, instance, origin=None, **kwargs):
+    # flashbacks of the member are deleted by cascade, which flashback_post_delete does not count
+    event_id = instance.event_id
+    transaction.on_commit(lambda: _update_event_unseen_count(event_id))
+
+    if _is_direct_delete(origin, models.EventMember):
+        instance.event.on_member_changed(instance.user_id, joined=False)
         return
-    preview = models.EventPreview.objects.filter(flashback=instance).first()
-    if preview is not None:
-        preview.switch_flashback_random()
+
+    # event or user is being deleted, sync what is left of the event after commit
+    transaction.on_commit(lambda: _sync_event_viewers(event_id))
+
+
+@receiver(post_save, sender=Friendship)
+def friendship_post_save(sender, instance, created, **kwargs):
+    if created:
+        _sync_friendship_viewers(instance)
+
+
+@receiver(post_delete, sender=Friendship)
+def friendship_post_delete(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(origin, Friendship):  # user deletion is handled by their memberships
+        _sync_friendship_viewers(instance)
+
+
+@receiver(pre_save, sender=models.Event)
+def remember_viewers_settings(sender, instance, **kwargs):
+    instance._viewers_settings = models.Event.objects.filter(pk=instance.pk).values_list(
+        "viewers_mode", "mutual_friends_limit"
+    ).first()
+
+
+@receiver(post_save, sender=models.Event)
+def check_viewers_settings(sender, instance, created, **kwargs):
+    previous_settings = getattr(instance, "_viewers_settings", None)
+    if created or previous_settings is None:
+        return
+
+    mutual_friends_limit = models.Event._meta.get_field("mutual_friends_limit").to_python(
+        instance.mutual_friends_limit
+    )
+    if previous_settings != (instance.viewers_mode, mutual_friends_limit) and instance.viewers_generated:
+        instance.generate_viewers()
+
+
+@receiver(post_delete, sender=models.Flashback)
+def flashback_post_delete(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(origin, models.Flashback):
+        models.EventViewer.objects.filter(event__eventmember__pk=instance.event_member_id).update_unseen_count()
+
+
+@receiver(post_save, sender=models.EventViewer)
+@receiver(post_delete, sender=models.EventViewer)
+def event_viewer_changed(sender, instance, created=False, **kwargs):
+    if created or kwargs["signal"] is post_delete:  # updates do not change who views the event
+        transaction.on_commit(lambda: invalidate("event", instance.event_id))
+
+
+@receiver(post_save, sender=models.Event)
+def invalidate_event_posters(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(instance.invalidate_posters)
+
+
+@receiver(post_delete, sender=models.EventPoster)
+def delete_poster_file(sender, instance, **kwargs):
+    if instance.file:
+        transaction.on_commit(lambda: instance.file.delete(save=False))
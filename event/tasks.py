@@ -1,8 +1,10 @@
 from django.utils import timezone
 from celery import shared_task
 
-from event.models import Event, Flashback, FlashbackMediaType, FlashbackVideoCheckNsfwJob
-from utils import nsfw_detection
+from event.models import Event, EventPoster, Flashback, FlashbackMediaType
+
+FLASHBACK_PROCESSING_SWEEP_GRACE = 60 * 5
+NSFW_CHECK_BATCH_SIZE = 16
 
 
 """ Global running tasks """
@@ -20,57 +22,65 @@ def check_event_status():
 
 @shared_task
 def check_flashbacks_nsfw():
-    for flashback in Flashback.objects.filter(is_nsfw=None, is_processed=True):
-        check_nsfw_flashbacks.delay(flashback.id)
+    """ Enqueues the nsfw checks that are due, a check is only enqueued by the one who claimed it. """
+    photo_leases = []
+    for flashback in Flashback.objects.nsfw_check_due().only("pk", "media_type"):
+        lease = flashback.claim_nsfw_check()
+        if lease is None:
+            continue
+        if flashback.media_type == FlashbackMediaType.PHOTO:
+            photo_leases.append((flashback.pk, lease))
+        else:
+            check_nsfw_flashbacks.delay(flashback.pk, lease)
+
+    for i in range(0, len(photo_leases), NSFW_CHECK_BATCH_SIZE):
+        check_nsfw_photo_flashbacks.delay(photo_leases[i:i + NSFW_CHECK_BATCH_SIZE])
 
 
 @shared_task
-def process_flashbacks():
-    for flashback in Flashback.objects.filter(is_processed=False):
-        process_flashback.delay(flashback.id)
+def sweep_flashbacks_processing():
+    """ Processing is triggered on upload, this only picks up flashbacks whose trigger or worker was lost. """
+    orphaned = Flashback.objects.processing_orphaned(grace_seconds=FLASHBACK_PROCESSING_SWEEP_GRACE)
+    for flashback_id in orphaned.values_list("id", flat=True):
+        process_flashback.delay(flashback_id)
 
 
 """ Flashbacks instance spec tasks """
 
 
 @shared_task
-def check_nsfw_flashbacks(flashback_id: int):
-    flashback = Flashback.objects.get(id=flashback_id)
-
-    if flashback.media_type == FlashbackMediaType.PHOTO:
-        if not flashback.media:
-            return
-
-        categories, flashback.is_nsfw = nsfw_detection.check_nsfw_photo_aws(flashback.media_key)
-        flashback.save()
-
-    if flashback.media_type == FlashbackMediaType.VIDEO:
-        if not flashback.video_media:
-            return
+def check_nsfw_flashbacks(flashback_id: int, lease: int = None):
+    """ Checks run with the lease they were claimed with, checks enqueued without one are claimed again when due. """
+    flashback = Flashback.objects.filter(id=flashback_id).first()
+    if flashback is not None and lease is not None:
+        flashback.check_nsfw(lease)
 
-        flashback_nsfw_job, created = FlashbackVideoCheckNsfwJob.objects.get_or_create(
-            flashback=flashback
-        )
 
-        if not flashback_nsfw_job.is_valid:
-            flashback_nsfw_job.delete()
-            return
-
-        if created:
-            flashback_nsfw_job.job_id = nsfw_detection.start_video_moderation(flashback.video_media_key)
-            flashback_nsfw_job.save()
-            return
-
-        categories, is_nsfw = flashback_nsfw_job.load_result()
-        if is_nsfw is not None:
-            flashback.is_nsfw = is_nsfw
-            flashback.save()
-            flashback_nsfw_job.delete()
+@shared_task
+def check_nsfw_photo_flashbacks(photo_leases: list[tuple[int, int]]):
+    """ Photos given as (flashback id, lease) pairs. """
+    leases = {flashback_id: lease for flashback_id, lease in photo_leases}
+    Flashback.check_photos_nsfw([
+        flashback for flashback in Flashback.objects.filter(id__in=leases)
+        if flashback.start_nsfw_check(leases[flashback.pk])
+    ])
 
 
 @shared_task
 def process_flashback(flashback_id: int):
-    Flashback.objects.get(id=flashback_id).process_media()
+    flashback = Flashback.objects.get(id=flashback_id)
+    flashback.process_media()
+    if not flashback.is_processed:
+        return
+    lease = flashback.claim_nsfw_check()
+    if lease is not None:
+        check_nsfw_flashbacks.delay(flashback.pk, lease)
 
 
+""" Posters """
 
+@shared_task
+def render_poster(poster_id: int):
+    poster = EventPoster.objects.select_related("event", "template", "color_palette").filter(id=poster_id).first()
+    if poster is not None:  # deleted when the event changed
+        poster.render()
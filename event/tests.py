@@ -0,0 +1,371 @@
+import importlib
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.apps import apps
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from event import poster
+from event.models import (
+    FLASHBACK_PROCESSING_MAX_ATTEMPTS,
+    Event, EventMember, EventPoster, EventPosterStatus, EventPosterTemplate, EventPosterTemplateColorPalette,
+    EventViewer, EventViewersMode, Flashback, FlashbackMediaType, FlashbackNsfwState, FlashbackProcessingState,
+    FlashbackViewer,
+)
+from event.tasks import check_event_status, check_nsfw_photo_flashbacks
+from friendship.models import Friendship
+from user.models import User
+from utils.media import ThumbnailError
+from utils.pagination import DefaultCursorPagination
+
+
+def create_user(username: str) -> User:
+    return User.objects.create(username=username, email=f"{username}@flashback.test")
+
+
+def create_event(viewers_mode=EventViewersMode.ONLY_MEMBERS, closed=False, **kwargs) -> Event:
+    now = timezone.now()
+    kwargs = {"title": "party", "emoji": "🎉", **kwargs}
+    start_at = now - timezone.timedelta(days=2) if closed else now - timezone.timedelta(hours=1)
+    end_at = now - timezone.timedelta(days=1) if closed else now + timezone.timedelta(days=1)
+    return Event.objects.create(
+        start_at=start_at, end_at=end_at, viewers_mode=viewers_mode, **kwargs
+    )
+
+
+class ViewersMaintenanceTestCase(TestCase):
+    """ Mutual friends limit 0.9 needs friends with 1 member up to 5 members and with 2 members from 6 members. """
+
+    def setUp(self):
+        self.members = [create_user(f"member{i}") for i in range(4)]
+        self.newcomer, self.loner = create_user("newcomer"), create_user("loner")
+        self.friend, self.close_friend, self.newcomer_friend = (
+            create_user("friend"), create_user("close_friend"), create_user("newcomer_friend")
+        )
+        self.event = create_event(EventViewersMode.MUTUAL_FRIENDS, mutual_friends_limit=Decimal("0.9"))
+        for user in self.members:
+            EventMember.objects.create(event=self.event, user=user)
+        self.friendship = Friendship.objects.create(from_user=self.members[0], to_user=self.friend)
+        Friendship.objects.create(from_user=self.members[0], to_user=self.close_friend)
+        Friendship.objects.create(from_user=self.close_friend, to_user=self.members[1])
+        Friendship.objects.create(from_user=self.newcomer, to_user=self.friend)
+        Friendship.objects.create(from_user=self.newcomer, to_user=self.newcomer_friend)
+        self.event.generate_viewers()
+
+    def get_viewers(self) -> dict[User, tuple[bool, int]]:
+        return {
+            viewer.user: (viewer.is_member, viewer.mutual_members_count)
+            for viewer in EventViewer.objects.filter(event=self.event).select_related("user")
+        }
+
+    def expected_viewers(self, members: list[User], **friends: int) -> dict[User, tuple[bool, int]]:
+        viewers = {user: (True, 0) for user in members}
+        viewers.update({getattr(self, name): (False, count) for name, count in friends.items()})
+        return viewers
+
+    def add_member(self, user: User) -> EventMember:
+        return EventMember.objects.create(event=self.event, user=user)
+
+    def test_generate_viewers_only_touches_rows_that_differ(self):
+        self.assertEqual(self.get_viewers(), self.expected_viewers(self.members, friend=1, close_friend=2))
+
+        kept = set(EventViewer.objects.filter(event=self.event).values_list("pk", flat=True))
+        EventViewer.objects.create(event=self.event, user=self.loner)
+        EventViewer.objects.filter(event=self.event, user=self.close_friend).update(mutual_members_count=5)
+        self.event.generate_viewers()
+        self.assertEqual(self.get_viewers(), self.expected_viewers(self.members, friend=1, close_friend=2))
+        self.assertEqual(set(EventViewer.objects.filter(event=self.event).values_list("pk", flat=True)), kept)
+
+    def test_member_changes_crossing_the_threshold(self):
+        self.add_member(self.newcomer)
+        members = [*self.members, self.newcomer]
+        self.assertEqual(
+            self.get_viewers(), self.expected_viewers(members, friend=2, close_friend=2, newcomer_friend=1)
+        )
+
+        loner_member = self.add_member(self.loner)
+        self.assertEqual(self.get_viewers(), self.expected_viewers([*members, self.loner], friend=2, close_friend=2))
+
+        loner_member.delete()
+        self.assertEqual(
+            self.get_viewers(), self.expected_viewers(members, friend=2, close_friend=2, newcomer_friend=1)
+        )
+
+    def test_member_leaving_removes_friends_left_alone(self):
+        EventMember.objects.get(event=self.event, user=self.members[0]).delete()
+        self.assertEqual(self.get_viewers(), self.expected_viewers(self.members[1:], close_friend=1))
+
+    def test_friendship_changes(self):
+        self.friendship.delete()
+        self.assertEqual(self.get_viewers(), self.expected_viewers(self.members, close_friend=2))
+
+        Friendship.objects.create(from_user=self.loner, to_user=self.members[3])
+        self.assertEqual(self.get_viewers(), self.expected_viewers(self.members, close_friend=2, loner=1))
+
+    def test_viewers_settings_changes_resync(self):
+        self.event.viewers_mode = EventViewersMode.ONLY_MEMBERS
+        self.event.save()
+        self.assertEqual(self.get_viewers(), self.expected_viewers(self.members))
+
+        self.event.viewers_mode = EventViewersMode.ALL_FRIENDS
+        self.event.save()
+        self.assertEqual(self.get_viewers(), self.expected_viewers(self.members, friend=1, close_friend=2))
+
+        members = [*self.members, self.newcomer, self.loner]
+        self.event.viewers_mode = EventViewersMode.MUTUAL_FRIENDS
+        self.event.save()
+        self.add_member(self.newcomer)
+        self.add_member(self.loner)
+        self.assertEqual(self.get_viewers(), self.expected_viewers(members, friend=2, close_friend=2))
+
+        self.event.mutual_friends_limit = Decimal("0.5")
+        self.event.save()
+        self.assertEqual(
+            self.get_viewers(), self.expected_viewers(members, friend=2, close_friend=2, newcomer_friend=1)
+        )
+
+
+class FlashbackViewersTestCase(TestCase):
+
+    def setUp(self):
+        self.host, self.guest, self.friend = create_user("host"), create_user("guest"), create_user("friend")
+        self.event = create_event(EventViewersMode.ALL_FRIENDS, closed=True)
+        self.host_member = EventMember.objects.create(event=self.event, user=self.host)
+        self.guest_member = EventMember.objects.create(event=self.event, user=self.guest)
+        Flashback.objects.create(event_member=self.host_member)
+        Flashback.objects.create(event_member=self.guest_member)
+        self.event.on_close()
+
+    def test_viewer_added_after_close_gets_flashbacks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Friendship.objects.create(from_user=self.host, to_user=self.friend)
+
+        viewer = EventViewer.objects.get(event=self.event, user=self.friend)
+        self.assertEqual(FlashbackViewer.objects.filter(event_viewer=viewer, is_seen=False).count(), 2)
+        self.assertEqual(viewer.unseen_count, 2)
+
+    def test_seen_flashbacks_stay_seen_after_close_actions(self):
+        event = create_event(EventViewersMode.ALL_FRIENDS)
+        member = EventMember.objects.create(event=event, user=self.host)
+        Flashback.objects.create(event_member=member)
+        event.close()
+        FlashbackViewer.objects.get(event_viewer__event=event, event_viewer__user=self.host).mark_as_seen()
+
+        check_event_status()
+        viewer = EventViewer.objects.get(event=event, user=self.host)
+        self.assertEqual(FlashbackViewer.objects.filter(event_viewer=viewer, is_seen=False).count(), 0)
+        self.assertEqual(viewer.unseen_count, 0)
+
+    def test_migration_counts_unseen(self):
+        migration = importlib.import_module("event.migrations.0043_eventviewer_unseen_count")
+        EventViewer.objects.update(unseen_count=0)
+        migration.count_unseen_flashbacks(apps, None)
+        self.assertEqual(EventViewer.objects.get(event=self.event, user=self.host).unseen_count, 2)
+
+    def test_member_deletion_recounts_unseen(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest_member.delete()
+        self.assertEqual(EventViewer.objects.get(event=self.event, user=self.host).unseen_count, 1)
+
+    def test_user_deletion_recounts_unseen(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest.delete()
+        self.assertEqual(EventViewer.objects.get(event=self.event, user=self.host).unseen_count, 1)
+
+
+class PossibleMembersTestCase(APITestCase):
+
+    def setUp(self):
+        self.host, self.guest = create_user("host"), create_user("guest")
+        self.event = create_event()
+        EventMember.objects.create(event=self.event, user=self.host)
+        EventMember.objects.create(event=self.event, user=self.guest)
+        self.candidates = [create_user(f"c{i:02}") for i in range(70)]
+        self.common_friends = self.candidates[50:53]
+        for candidate in self.candidates:
+            Friendship.objects.create(from_user=self.host, to_user=candidate)
+        for candidate in self.common_friends:
+            Friendship.objects.create(from_user=self.guest, to_user=candidate)
+        self.client.force_authenticate(self.host)
+
+    @mock.patch.object(DefaultCursorPagination, "offset_cutoff", 5)  # most candidates tie on their count
+    def test_cursor_pages_ranked_candidates_once(self):
+        ids, url = [], f"/api/event/{self.event.pk}/member/possible/"
+        for _ in range(10):  # a cursor stuck on ties never ends
+            if url is None:
+                break
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [user["id"] for user in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), {user.pk for user in self.candidates})
+        self.assertEqual(set(ids[:3]), {user.pk for user in self.common_friends})
+
+
+class EventSearchTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = create_user("host")
+        self.party = create_event(title="party")
+        self.pizza = create_event(title="pizza", emoji="🍕")
+        for event in (self.party, self.pizza):
+            EventMember.objects.create(event=event, user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def search(self, term: str) -> list[int]:
+        response = self.client.get("/api/event/search/", {"q": term})
+        self.assertEqual(response.status_code, 200)
+        return [event["pk"] for event in response.data["results"]]
+
+    def test_search_matches_title_and_emoji(self):
+        self.assertEqual(self.search("PAR"), [self.party.pk])
+        self.assertEqual(self.search("🍕"), [self.pizza.pk])
+
+
+class EventPosterRenderTestCase(TestCase):
+
+    def setUp(self):
+        template = EventPosterTemplate.objects.create(title="soft", html_file="soft_dark.html")
+        palette = EventPosterTemplateColorPalette.objects.create(template=template, color="#336699")
+        self.poster = EventPoster.objects.create(
+            key="poster", event=create_event(), template=template, color_palette=palette
+        )
+
+    def test_failure_marks_poster_failed(self):
+        with mock.patch.object(EventPosterTemplate, "render_pdf", side_effect=OSError("no fonts")):
+            with self.assertRaises(OSError):
+                self.poster.render()
+        self.assertEqual(EventPoster.objects.get(pk=self.poster.pk).status, EventPosterStatus.FAILED)
+
+    def test_failure_does_not_resurrect_invalidated_poster(self):
+        def invalidate_then_fail(*args):
+            EventPoster.objects.filter(pk=self.poster.pk).delete()
+            raise OSError("no fonts")
+
+        with mock.patch.object(EventPosterTemplate, "render_pdf", side_effect=invalidate_then_fail):
+            with self.assertRaises(OSError):
+                self.poster.render()
+        self.assertFalse(EventPoster.objects.exists())
+
+
+class PosterRendererTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        stylesheet = Path(self.directory.name) / "poster.css"
+        stylesheet.write_text("body { color: #336699; }")
+        self.stylesheet_url = stylesheet.as_uri()
+        template = EventPosterTemplate.objects.create(title="soft", html_file="soft_dark.html")
+        self.palette = EventPosterTemplateColorPalette.objects.create(template=template, color="#336699")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_stylesheets_load_through_memory_fetcher(self):
+        renderer = poster.PosterRenderer("soft_dark.html")
+        html = f'<html><head><link href="{self.stylesheet_url}" rel="stylesheet"></head><body>party</body></html>'
+        with mock.patch.object(renderer, "render_html", return_value=html):
+            with self.assertNoLogs("weasyprint", level="ERROR"):
+                renderer.render_pdf(create_event(), self.palette)
+                renderer.render_pdf(create_event(), self.palette)
+        self.assertIn(self.stylesheet_url, poster.get_url_fetcher()._assets)
+
+    @override_settings(DEBUG=False)
+    def test_renderer_is_looked_up_once_per_process(self):
+        poster._get_renderer.cache_clear()
+        poster._read_template_mtime_once.cache_clear()
+        with mock.patch.object(poster, "get_template", wraps=poster.get_template) as get_template:
+            renderer = poster.get_renderer("soft_light.html")
+            lookups = get_template.call_count
+            self.assertIs(poster.get_renderer("soft_light.html"), renderer)
+            self.assertEqual(get_template.call_count, lookups)
+
+
+@mock.patch("event.models.get_moderation_backend")
+class NsfwCheckLeaseTestCase(TestCase):
+
+    def setUp(self):
+        member = EventMember.objects.create(event=create_event(), user=create_user("host"))
+        self.flashback = Flashback.objects.create(
+            event_member=member, media="flashback/photo.jpg", nsfw_next_check_at=timezone.now()
+        )
+
+    def get_flashback(self) -> Flashback:
+        return Flashback.objects.get(pk=self.flashback.pk)
+
+    def test_claim_is_exclusive(self, get_moderation_backend):
+        self.assertEqual(self.get_flashback().claim_nsfw_check(), 1)
+        self.assertIsNone(self.get_flashback().claim_nsfw_check())
+
+    def test_redelivered_check_runs_once(self, get_moderation_backend):
+        get_moderation_backend.return_value.check_photos.return_value = [({}, False)]
+        lease = self.get_flashback().claim_nsfw_check()
+
+        self.get_flashback().check_nsfw(lease)
+        self.get_flashback().check_nsfw(lease)
+        self.assertEqual(get_moderation_backend.return_value.check_photos.call_count, 1)
+        self.assertEqual(self.get_flashback().nsfw_state, FlashbackNsfwState.DONE)
+
+    def test_redelivered_photo_batch_runs_once(self, get_moderation_backend):
+        get_moderation_backend.return_value.check_photos.return_value = [({}, False)]
+        lease = self.get_flashback().claim_nsfw_check()
+
+        check_nsfw_photo_flashbacks([(self.flashback.pk, lease)])
+        check_nsfw_photo_flashbacks([(self.flashback.pk, lease)])
+        get_moderation_backend.return_value.check_photos.assert_called_once_with(["media/private/flashback/photo.jpg"])
+        self.assertFalse(self.get_flashback().is_nsfw)
+
+    def test_expired_lease_does_not_overwrite_new_claim(self, get_moderation_backend):
+        stale = self.get_flashback()
+        stale.start_nsfw_check(stale.claim_nsfw_check())
+        Flashback.objects.filter(pk=self.flashback.pk).update(nsfw_next_check_at=timezone.now())  # lease expired
+        self.assertEqual(self.get_flashback().claim_nsfw_check(), 2)
+
+        self.assertFalse(stale.set_nsfw_result(True))
+        self.assertFalse(stale.schedule_nsfw_check(FlashbackNsfwState.QUEUED))
+        flashback = self.get_flashback()
+        self.assertEqual((flashback.nsfw_state, flashback.is_nsfw), (FlashbackNsfwState.CLAIMED, None))
+
+
+class FlashbackProcessingTestCase(TestCase):
+
+    def setUp(self):
+        member = EventMember.objects.create(event=create_event(), user=create_user("host"))
+        self.flashback = Flashback.objects.create(
+            event_member=member, media_type=FlashbackMediaType.VIDEO, video_media="flashback/video.mp4"
+        )
+
+    def get_flashback(self) -> Flashback:
+        return Flashback.objects.get(pk=self.flashback.pk)
+
+    def process(self, error: ThumbnailError):
+        with mock.patch("event.models.generate_video_thumbnail", side_effect=error):
+            self.get_flashback().process_media()
+
+    def test_claim_is_exclusive(self):
+        self.assertTrue(self.get_flashback().claim_processing())
+        self.assertFalse(self.get_flashback().claim_processing())
+
+    def test_invalid_video_fails_fast(self):
+        self.process(ThumbnailError(ThumbnailError.INVALID_INPUT, "moov atom not found"))
+        flashback = self.get_flashback()
+        self.assertEqual(
+            (flashback.processing_state, flashback.processing_attempts, flashback.processing_error),
+            (FlashbackProcessingState.FAILED, 1, ThumbnailError.INVALID_INPUT),
+        )
+
+    def test_transient_failure_is_retried_until_max_attempts(self):
+        for attempt in range(1, FLASHBACK_PROCESSING_MAX_ATTEMPTS + 1):
+            self.process(ThumbnailError(ThumbnailError.TIMEOUT, retryable=True))
+            retried = attempt < FLASHBACK_PROCESSING_MAX_ATTEMPTS
+            self.assertEqual(
+                self.get_flashback().processing_state,
+                FlashbackProcessingState.PENDING if retried else FlashbackProcessingState.FAILED,
+            )
+        self.assertFalse(self.get_flashback().is_processed)
@@ -1,11 +1,14 @@
 import uuid
 
-from django.db.models import QuerySet
+from django.db.models import QuerySet, F
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse, FileResponse
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseRedirect, FileResponse
 
 from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.decorators import action
+from rest_framework.reverse import reverse
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
@@ -16,13 +19,13 @@ from celery import chain
 from event import serializers as event_serializers
 from event import models as event_models
 from event.permissions import IsEventHost
-from event.tasks import check_nsfw_flashbacks, process_flashback
-from user.serializers import MiniUserSerializer, MiniUserContextualSerializer
-from user.models import User
+from event.qrcodes import QRCODE_CONTENT_TYPES
+from event.validators import hex_color_validator
+from event.tasks import check_nsfw_flashbacks, process_flashback, render_poster
 from utils.shortcuts import get_object_or_exception
-from utils.mixins import SearchAPIMixin
+from utils.mixins import SearchAPIMixin, ListResponseMixin
+from utils.fulltext import fulltext_filter
 from utils.views import parse_int_value, parse_str_value, parse_boolean_value
-from event.status import EventMemberStatus
 
 import boto3
 from django.conf import settings
@@ -31,7 +34,11 @@ from django.conf import settings
 class EventViewSet(SearchAPIMixin, viewsets.ModelViewSet):
     lookup_field = "pk"
     parser_classes = [MultiPartParser, FormParser, JSONParser]
-    search_fields = ["title", "emoji"]
+    cursor_ordering = {
+        "list": ("-start_at", "-pk"),
+        "search": ("-start_at", "-pk"),
+        "to_view": ("-event_end_at", "-event_id"),  # event_end_at is annotated in to_view
+    }
 
     def get_serializer_class(self):
         if self.action in ("to_view", "mark_as_open"): return event_serializers.EventViewerSerializer
@@ -60,7 +67,7 @@ class EventViewSet(SearchAPIMixin, viewsets.ModelViewSet):
                     preview.switch_flashback_random()
 
     def get_queryset(self) -> QuerySet:
-        qs = self.request.user.events.order_by("-start_at")
+        qs = self.request.user.events.with_status().with_flashbacks_count().order_by("-start_at")
 
         # filtering by status
         status_filter = self.request.query_params.get("status", None)
@@ -70,6 +77,10 @@ class EventViewSet(SearchAPIMixin, viewsets.ModelViewSet):
             qs = qs.filter_by_status(status=status_filter)
         return qs
 
+    def get_search_query(self, search_term):
+        events = event_models.Event.objects.visible_to(self.request.user).with_status().with_flashbacks_count()
+        return fulltext_filter(events, search_term, symbol_fields=["emoji"])
+
     @action(detail=True, methods=["post"])
     def close(self, request, pk):
         event = get_object_or_404(self.get_queryset(), pk=pk)
@@ -78,14 +89,18 @@ class EventViewSet(SearchAPIMixin, viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"])
     def to_view(self, request, **kwargs):
-        ev = event_models.EventViewer.objects.filter(user=self.request.user).order_by("-event__end_at")
+        ev = event_models.EventViewer.objects.filter(
+            user=self.request.user
+        ).annotate(event_end_at=F("event__end_at")).with_feed_data()
         search_query = request.query_params.get("q", None)
         is_member_filter = parse_boolean_value(request.query_params.get("is_member"), default=None)
         if is_member_filter is not None:
-            ev = ev.filter(is_member=True)
+            ev = ev.filter(is_member=is_member_filter)
         if search_query is not None:
-            ev = ev.filter(event__title__icontains=search_query)
-        return Response(self.get_serializer(ev, many=True).data, status=status.HTTP_200_OK)
+            ev = fulltext_filter(
+                ev, search_query, model=event_models.Event, lookup="event", symbol_fields=["event__emoji"]
+            )
+        return self.list_response(ev)
 
     @action(detail=True, methods=["get"])
     def get_friends_members(self, request, pk):
@@ -137,11 +152,34 @@ class EventViewSet(SearchAPIMixin, viewsets.ModelViewSet):
                 content_type="application/html"
             )
         if file_type == "pdf":
-            response = HttpResponse(template.render_pdf(event, color_palette), content_type="application/pdf")
-            response["Content-Disposition"] = f'inline; filename="{event.title}_poster.pdf"'
-            return response
+            poster, created = event_models.EventPoster.objects.get_or_create(
+                key=template.get_poster_key(event, color_palette),
+                defaults={"event": event, "template": template, "color_palette": color_palette},
+            )
+            if poster.status == event_models.EventPosterStatus.DONE:
+                return HttpResponseRedirect(poster.file.url)
+            if created or poster.status == event_models.EventPosterStatus.FAILED or poster.is_stale:
+                if not created:
+                    poster.status = event_models.EventPosterStatus.PENDING
+                    poster.save()
+                transaction.on_commit(lambda: render_poster.delay(poster.pk))
+            return self.poster_status_response(poster, status.HTTP_202_ACCEPTED)
         return Response({"file_type": ["Invalid file type. (html/pdf)"]}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=["get"])
+    def poster_status(self, request, pk):
+        poster = get_object_or_404(self.get_object().posters.all(), pk=parse_int_value(request.query_params, "poster"))
+        return self.poster_status_response(poster, status.HTTP_200_OK)
+
+    def poster_status_response(self, poster, response_status):
+        status_url = reverse("event-poster-status", kwargs={"pk": poster.event_id}, request=self.request)
+        return Response({
+            "poster": poster.pk,
+            "status": poster.status,
+            "status_url": f"{status_url}?poster={poster.pk}",
+            "url": poster.file.url if poster.status == event_models.EventPosterStatus.DONE else None,
+        }, status=response_status)
+
     @action(detail=False, methods=["get"])
     def poster_templates(self, request, **kwargs):
         serializer = self.get_serializer(
@@ -173,6 +211,25 @@ class EventViewSet(SearchAPIMixin, viewsets.ModelViewSet):
         invite, created = event_models.EventInviteCode.objects.get_or_create(event=self.get_object())
         return Response({"code": invite.code}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["get"])
+    def qrcode(self, request, **kwargs):
+        kind = request.query_params.get("kind", "png")
+        if kind not in QRCODE_CONTENT_TYPES:
+            return Response({"kind": ["Invalid kind. (png/svg)"]}, status=status.HTTP_400_BAD_REQUEST)
+
+        colors = {
+            "front_color": request.query_params.get("front_color", "#ffffff"),
+            "background_color": request.query_params.get("background_color", "#000000"),
+        }
+        for key, value in colors.items():
+            try: hex_color_validator(value)
+            except DjangoValidationError as e: return Response({key: e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+        invite, created = event_models.EventInviteCode.objects.get_or_create(event=self.get_object())
+        response = HttpResponse(invite.get_qrcode(kind=kind, **colors), content_type=QRCODE_CONTENT_TYPES[kind])
+        response["Cache-Control"] = "private, max-age=86400"
+        return response
+
     @action(detail=True, methods=["get"])
     def get_viewer(self, request, **kwargs):
         viewer = get_object_or_404(event_models.EventViewer.objects.all(), event=self.get_object(), user=self.request.user)
@@ -195,7 +252,7 @@ class EventViewSet(SearchAPIMixin, viewsets.ModelViewSet):
         return Response(status=status.HTTP_200_OK)
 
 
-class EventFlashbackViewSet(mixins.ListModelMixin,
+class EventFlashbackViewSet(ListResponseMixin,
                             mixins.RetrieveModelMixin,
                             mixins.CreateModelMixin,
                             mixins.DestroyModelMixin,
@@ -205,21 +262,18 @@ class EventFlashbackViewSet(mixins.ListModelMixin,
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     serializer_class = event_serializers.FlashbackSerializer
+    cursor_ordering = {"list": ("created_at", "pk")}
 
     def get_queryset(self):
-        event_viewer = get_object_or_exception(
-            event_models.EventViewer.objects.all(), PermissionDenied(),
-            event__pk=self.kwargs.get("event_id"),
-            user__pk=self.request.user.pk
-        )
+        event_id = parse_int_value(self.kwargs, "event_id")
+        if self.request.user.pk not in event_models.EventViewer.get_user_ids(event_id):
+            raise PermissionDenied()
 
         queryset = event_models.Flashback.objects.filter(
-            event_member__event__pk=event_viewer.event.pk
-        )
-
-        if not event_viewer.event.allow_nsfw:
-            nsfw_flashbacks = [i.id for i in queryset.filter(is_nsfw=True)]
-            queryset = queryset.exclude(id__in=nsfw_flashbacks)
+            event_member__event__pk=event_id
+        ).exclude(
+            is_nsfw=True, event_member__event__allow_nsfw=False
+        ).select_related("event_member__user", "event_member__event").prefetch_related("eventpreview_set")
 
         return queryset.order_by("created_at")
 
@@ -244,12 +298,13 @@ class EventFlashbackViewSet(mixins.ListModelMixin,
 
         serializer = event_serializers.CreateFlashbackSerializer(data=request.data)
         if serializer.is_valid():
-            event_models.Flashback.objects.create(
+            flashback = event_models.Flashback.objects.create(
                 media=serializer.validated_data.get("media", None),
                 video_media=serializer.validated_data.get("video_media", None),
                 media_type=serializer.validated_data["media_type"],
                 event_member=event_member,
             )
+            transaction.on_commit(lambda: process_flashback.delay(flashback.pk))
 
             return Response(status=status.HTTP_201_CREATED)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -257,11 +312,11 @@ class EventFlashbackViewSet(mixins.ListModelMixin,
     @action(detail=True, methods=["post"])
     def mark_as_seen(self, request, pk):
         flashback_viewer = get_object_or_exception(
-            event_models.FlashbackViewer.objects.all(), PermissionDenied(), user=self.request.user, pk=pk
+            event_models.FlashbackViewer.objects.all(), PermissionDenied(), event_viewer__user=self.request.user, pk=pk
         )
 
-        flashback_viewer.is_seen = True
-        flashback_viewer.save()
+        flashback_viewer.mark_as_seen()
+        return Response(status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["get"])
     def generate_storage(self, request, **kwargs):
@@ -292,7 +347,7 @@ class EventFlashbackViewSet(mixins.ListModelMixin,
         return Response({"storage": storage, "path": file_path}, status=status.HTTP_200_OK)
 
 
-class MemberViewSet(mixins.ListModelMixin,
+class MemberViewSet(ListResponseMixin,
                     mixins.RetrieveModelMixin,
                     mixins.DestroyModelMixin,
                     viewsets.GenericViewSet):
@@ -300,6 +355,11 @@ class MemberViewSet(mixins.ListModelMixin,
     lookup_field = "user__pk"
     serializer_class = event_serializers.EventMemberSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = {
+        "list": ("pk",),
+        "invites": ("-date", "-pk"),
+        "possible": ("possible_rank",),
+    }
 
     def get_queryset(self) -> QuerySet:
         event_id = self.kwargs.get("event_id", None)
@@ -311,7 +371,7 @@ class MemberViewSet(mixins.ListModelMixin,
         if not is_member and not is_invited:
             raise PermissionDenied()
 
-        return event_models.EventMember.objects.filter(event=event)
+        return event_models.EventMember.objects.filter(event=event).select_related("user", "added_by")
 
     @action(detail=False, methods=["get"])
     def invite(self, request, *args, **kwargs):
@@ -354,41 +414,20 @@ class MemberViewSet(mixins.ListModelMixin,
     @action(detail=False, methods=["get"])
     def invites(self, request, *args, **kwargs):
         event_id = parse_int_value(self.kwargs, "event_id")
-        status_filter = parse_int_value(self.kwargs, "status", default=None)
+        status_filter = parse_int_value(self.request.query_params, "status", default=None)
 
-        event_invites = event_models.EventInvite.objects.filter(event_id=event_id)
+        event_invites = event_models.EventInvite.objects.filter(
+            event_id=event_id
+        ).select_related("user", "invited_by")
         if status_filter is not None:
             event_invites = event_invites.filter(status=status_filter)
 
-        serializer = event_serializers.EventInviteSerializer(
-            instance=event_invites, many=True
-        )
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.list_response(event_invites, serializer_class=event_serializers.EventInviteSerializer)
 
     @action(detail=False, methods=["get"])
     def possible(self, request, *args, **kwargs):
-        event_id = parse_int_value(self.kwargs, "event_id")
+        event = get_object_or_404(event_models.Event.objects.all(), pk=parse_int_value(self.kwargs, "event_id"))
         search_filter = request.query_params.get("search", None)
-        search_filter = search_filter.lower() if search_filter is not None else search_filter
-
-        possible_members, members_id = set(), []
-        for em in event_models.EventMember.objects.filter(event_id=event_id):
-            members_id.append(em.user.id)
-            for f in em.user.friends:
-                if search_filter is not None and search_filter not in f.username.lower():
-                    continue
-                possible_members.add(f.id)
-
-        response_data = []
-        for pm_id in possible_members:
-            if self.request.user.id == pm_id:
-                continue
-            data = MiniUserSerializer(instance=User.objects.get(id=pm_id)).data
-            data["status"] = EventMemberStatus.NONE.value
-            if pm_id in members_id:
-                data["status"] = EventMemberStatus.MEMBER.value
-            elif event_models.EventInvite.objects.filter(event_id=event_id, user_id=pm_id).exists():
-                data["status"] = EventMemberStatus.INVITED.value
-            response_data.append(data)
-        return Response(response_data, status=status.HTTP_200_OK)
+
+        possible_members = event.get_possible_members(search=search_filter).exclude(pk=request.user.pk)
+        return self.list_response(possible_members, serializer_class=event_serializers.PossibleMemberSerializer)
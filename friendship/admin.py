@@ -4,4 +4,5 @@ from friendship import models
 
 
 admin.site.register(models.Friendship)
-admin.site.register(models.FriendRequest)
\ No newline at end of file
+admin.site.register(models.FriendRequest)
+admin.site.register(models.FriendshipEdge)
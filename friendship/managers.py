@@ -1,4 +1,5 @@
-from django.db.models import QuerySet, Q
+from django.db.models import QuerySet, Q, F, Count, Window
+from django.db.models.functions import RowNumber
 
 
 class FriendRequestQuerySet(QuerySet):
@@ -23,29 +24,46 @@ class FriendRequestQuerySet(QuerySet):
 class FriendshipQuerySet(QuerySet):
 
     def filter_by_user(self, user):
-        return self.filter(
-            Q(to_user=user) | Q(from_user=user)
-        )
+        return self.filter(edges__user=user)
 
     def get(self, *args, **kwargs):
-        from friendship.models import Friendship
-
         user_a, user_b = kwargs.get("user_a", None), kwargs.get("user_b", None)
         if user_a and user_b:
-            try:
-                return self.get(to_user=user_a, from_user=user_b)
-            except Friendship.DoesNotExist:
-                pass
-            try:
-                return self.get(to_user=user_b, from_user=user_a)
-            except Friendship.DoesNotExist:
-                return None
+            return self.filter(edges__user=user_a, edges__friend=user_b).first()
         return super().get(*args, **kwargs)
 
     def get_mutual_friends(self, user_a, user_b):
-        output = []
-        for friendship in user_a.friendship_set.all():
-            friend = friendship.get_friend(user_a)
-            if self.get(user_a=friend, user_b=user_b) and (friend != user_a and friend != user_b):
-                output.append(friend)
+        from user.models import User
+        return User.objects.filter(friend_edges__user=user_a).filter(friend_edges__user=user_b)
+
+
+class FriendshipEdgeQuerySet(QuerySet):
+
+    def friends_of(self, users: QuerySet) -> QuerySet:
+        """
+        Ids of friends of the users (queryset of user ids) grouped with count of the users
+        they are friends with as "users_count", the users themselves are left out.
+        """
+        return self.filter(
+            user__in=users
+        ).exclude(
+            friend__in=users
+        ).values("friend").annotate(users_count=Count("id")).order_by()
+
+    def mutual_friends_for(self, user, users, limit: int) -> dict:
+        """
+        Mutual friends of the user with each of the users in one query,
+        maps id of every user with a mutual friend to (mutual friends count, first `limit` mutual friends).
+        """
+        edges = self.filter(
+            user__in=users, friend__friend_edges__user=user
+        ).annotate(
+            rank=Window(RowNumber(), partition_by=F("user"), order_by=[F("friend__username").asc()]),
+            total=Window(Count("id"), partition_by=F("user")),
+        ).filter(rank__lte=limit).select_related("friend").order_by("user", "rank")
+
+        output = {}
+        for edge in edges:
+            count, friends = output.setdefault(edge.user_id, (edge.total, []))
+            friends.append(edge.friend)
         return output
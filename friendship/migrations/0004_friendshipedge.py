@@ -0,0 +1,48 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_friendship_edges(apps, schema_editor):
+    Friendship = apps.get_model("friendship", "Friendship")
+    FriendshipEdge = apps.get_model("friendship", "FriendshipEdge")
+
+    edges = []
+    for friendship in Friendship.objects.values("id", "from_user_id", "to_user_id").iterator(chunk_size=1000):
+        edges.append(FriendshipEdge(
+            friendship_id=friendship["id"], user_id=friendship["from_user_id"], friend_id=friendship["to_user_id"]
+        ))
+        edges.append(FriendshipEdge(
+            friendship_id=friendship["id"], user_id=friendship["to_user_id"], friend_id=friendship["from_user_id"]
+        ))
+        if len(edges) >= 1000:
+            FriendshipEdge.objects.bulk_create(edges, ignore_conflicts=True)
+            edges = []
+    FriendshipEdge.objects.bulk_create(edges, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friendship', '0003_friendship_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendshipEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_edges', to=settings.AUTH_USER_MODEL)),
+                ('friendship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='friendship.friendship')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friendship_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['friend', 'user'], name='friendship_edge_friend_idx')],
+                'unique_together': {('user', 'friend')},
+            },
+        ),
+        migrations.RunPython(create_friendship_edges, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.utils import timezone
 
 from user.models import User
-from friendship.managers import FriendshipQuerySet, FriendRequestQuerySet
+from friendship.managers import FriendshipQuerySet, FriendshipEdgeQuerySet, FriendRequestQuerySet
 
 
 class Friendship(models.Model):
@@ -24,6 +24,31 @@ class Friendship(models.Model):
         return default
 
 
+class FriendshipEdge(models.Model):
+    """ One direction of a friendship, every friendship has an edge for each of its users. """
+    objects = FriendshipEdgeQuerySet.as_manager()
+
+    friendship = models.ForeignKey(Friendship, on_delete=models.CASCADE, related_name="edges")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="friendship_edges")
+    friend = models.ForeignKey(User, on_delete=models.CASCADE, related_name="friend_edges")
+
+    class Meta:
+        unique_together = ("user", "friend")
+        indexes = [
+            models.Index(fields=["friend", "user"], name="friendship_edge_friend_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} <-> {self.friend}"
+
+    @classmethod
+    def for_friendship(cls, friendship: Friendship) -> list["FriendshipEdge"]:
+        return [
+            cls(friendship=friendship, user_id=friendship.from_user_id, friend_id=friendship.to_user_id),
+            cls(friendship=friendship, user_id=friendship.to_user_id, friend_id=friendship.from_user_id),
+        ]
+
+
 class FriendRequest(models.Model):
     objects = FriendRequestQuerySet.as_manager()
 
@@ -1,7 +1,14 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-from friendship.models import FriendRequest
+from friendship.models import FriendRequest, Friendship, FriendshipEdge
+
+
+@receiver(post_save, sender=Friendship)
+def create_friendship_edges(sender, instance, created, **kwargs):
+    # edges are deleted along with the friendship by cascade
+    if created:
+        FriendshipEdge.objects.bulk_create(FriendshipEdge.for_friendship(instance), ignore_conflicts=True)
 
 
 @receiver(post_save, sender=FriendRequest)
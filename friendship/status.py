@@ -1,6 +1,8 @@
 from enum import Enum
 from typing import TYPE_CHECKING
 
+from django.db.models import Q
+
 if TYPE_CHECKING:
     from user.models import User
 
@@ -13,10 +15,27 @@ class FriendshipStatus(Enum):
 
 
 def get_friendship_status(user_from: "User", user_to: "User") -> FriendshipStatus:
-    from friendship.models import FriendRequest
+    return get_friendship_statuses(user_from, [user_to])[user_to.pk]
+
+
+def get_friendship_statuses(user_from: "User", users_to: list["User"]) -> dict[int, FriendshipStatus]:
+    """ FriendshipStatus of user_from with every user of users_to in two queries, mapped by user id. """
+    from friendship.models import FriendRequest, FriendshipEdge
+
+    users_to_id = [user.pk for user in users_to]
+    statuses = dict.fromkeys(users_to_id, FriendshipStatus.NONE)
+
+    friend_requests = FriendRequest.objects.filter(
+        Q(from_user=user_from, to_user__in=users_to_id) | Q(to_user=user_from, from_user__in=users_to_id)
+    ).values_list("from_user_id", "to_user_id")
+    for from_user_id, to_user_id in friend_requests:
+        if from_user_id == user_from.pk: statuses[to_user_id] = FriendshipStatus.REQUEST_FROM_ME
+        else: statuses[from_user_id] = FriendshipStatus.REQUEST_TO_ME
+
+    friends_id = FriendshipEdge.objects.filter(
+        user=user_from, friend__in=users_to_id
+    ).values_list("friend_id", flat=True)
+    for friend_id in friends_id:
+        statuses[friend_id] = FriendshipStatus.FRIENDS
 
-    if user_from.is_friend_with(user_to): return FriendshipStatus.FRIENDS
-    friend_request = FriendRequest.objects.get(user_a=user_from, user_b=user_to)
-    if friend_request is None: return FriendshipStatus.NONE
-    if friend_request.from_user == user_from: return FriendshipStatus.REQUEST_FROM_ME
-    return FriendshipStatus.REQUEST_TO_ME
+    return statuses
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = "Recounts events, friends and flashbacks stats of users whose counters drifted"
+
+    def handle(self, *args, **kwargs):
+        fixed_count = User.objects.reconcile_stats()
+        self.stdout.write(self.style.SUCCESS(f"Stats of {fixed_count} users reconciled."))
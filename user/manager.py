@@ -1,4 +1,6 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework.authtoken.models import Token
 
 
@@ -30,4 +32,27 @@ class UserManager(BaseUserManager):
         if extra_fields.get("is_superuser") is False:
             raise ValueError("Superuser must have is_superuser set as True.")
 
-        return self.create_user(username, email, password, **extra_fields)
\ No newline at end of file
+        return self.create_user(username, email, password, **extra_fields)
+
+    def reconcile_stats(self) -> int:
+        """ Recounts stats columns of users whose counts drifted, returns count of fixed users. """
+        from event.models import EventMember, Flashback
+        from friendship.models import FriendshipEdge
+
+        def count_of(queryset, user_field):
+            return Coalesce(Subquery(
+                queryset.filter(**{user_field: OuterRef("pk")}).order_by().values(user_field).annotate(
+                    count=Count("pk")
+                ).values("count")
+            ), 0)
+
+        stats = {
+            "events_count": count_of(EventMember.objects.all(), "user"),
+            "friends_count": count_of(FriendshipEdge.objects.all(), "user"),
+            "flashbacks_count": count_of(Flashback.objects.all(), "event_member__user"),
+        }
+        drift = Q()
+        for name in stats.keys():
+            drift |= ~Q(**{name: F(f"real_{name}")})
+        drifted = self.annotate(**{f"real_{name}": count for name, count in stats.items()}).filter(drift).values("pk")
+        return self.filter(pk__in=drifted).update(**stats)
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_user_stats(apps, schema_editor):
+    User = apps.get_model("user", "User")
+    EventMember = apps.get_model("event", "EventMember")
+    Flashback = apps.get_model("event", "Flashback")
+    FriendshipEdge = apps.get_model("friendship", "FriendshipEdge")
+
+    def count_of(queryset, user_field):
+        return Coalesce(Subquery(
+            queryset.filter(**{user_field: OuterRef("pk")}).order_by().values(user_field).annotate(
+                count=Count("pk")
+            ).values("count")
+        ), 0)
+
+    User.objects.update(
+        events_count=count_of(EventMember.objects.all(), "user"),
+        friends_count=count_of(FriendshipEdge.objects.all(), "user"),
+        flashbacks_count=count_of(Flashback.objects.all(), "event_member__user"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0006_alter_user_about'),
+        ('event', '0044_event_members_and_indexes'),
+        ('friendship', '0004_friendshipedge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='events_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='flashbacks_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='friends_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_user_stats, migrations.RunPython.noop),
+    ]
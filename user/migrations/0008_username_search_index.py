@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_username_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":  # istartswith is UPPER(username) LIKE UPPER(term%)
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS user_username_upper_idx ON user_user (UPPER(username) varchar_pattern_ops)"
+        )
+    elif vendor == "sqlite":  # LIKE is case insensitive and can only use a NOCASE index
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS user_username_nocase_idx ON user_user (username COLLATE NOCASE)"
+        )
+
+
+def drop_username_search_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS user_username_upper_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS user_username_nocase_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0007_user_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_username_search_index, drop_username_search_index),
+    ]
@@ -8,7 +8,8 @@ from django.utils import timezone
 from django.conf import settings
 
 from user.manager import UserManager
-from utils.nsfw_detection import check_nsfw_photo_aws
+from utils.cache import CACHE_TIMEOUT, read_through
+from utils.nsfw_detection import get_moderation_backend
 
 
 def upload_profile_to(instance, filename):
@@ -39,6 +40,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     )
     about = models.CharField(max_length=25, default=None, null=True)
 
+    # stats kept up to date by signals, UserManager.reconcile_stats fixes drift
+    events_count = models.PositiveIntegerField(default=0)
+    friends_count = models.PositiveIntegerField(default=0)
+    flashbacks_count = models.PositiveIntegerField(default=0)
+
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS = ["email"]
 
@@ -55,29 +61,28 @@ class User(AbstractBaseUser, PermissionsMixin):
         return Friendship.objects.filter_by_user(self)
 
     def is_friend_with(self, user):
-        from friendship.models import Friendship
-        return Friendship.objects.get(user_a=self, user_b=user) is not None
+        return user.pk in self.friend_ids
 
     @property
-    def events(self) -> models.QuerySet:
-        from event.models import Event, EventMember
+    def friend_ids(self) -> set[int]:
+        from friendship.models import FriendshipEdge
+        return read_through("user", self.pk, "friend_ids", lambda: set(
+            FriendshipEdge.objects.filter(user=self).values_list("friend_id", flat=True)
+        ))
 
-        return Event.objects.filter(
-            pk__in=[em.event.pk for em in EventMember.objects.filter(user=self)]
-        )
+    @property
+    def event_ids(self) -> set[int]:
+        return read_through("user", self.pk, "event_ids", lambda: set(
+            self.events.values_list("pk", flat=True)
+        ))
 
     @property
     def friends(self) -> models.QuerySet:
-        from friendship.models import Friendship
-
-        return User.objects.filter(
-            id__in=[
-                fs.get_friend(self).id for fs in self.friendship_set
-            ]
-        )
+        return User.objects.filter(friend_edges__user=self)
 
     def mutual_friends(self, other_user: "User") -> models.QuerySet:
-        return self.friends.intersection(other_user.friends)
+        from friendship.models import Friendship
+        return Friendship.objects.get_mutual_friends(self, other_user)
 
     @property
     def flashbacks(self):
@@ -86,15 +91,30 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def viewers_for_user(self, for_user):
         from event.models import EventViewer
-        return EventViewer.objects.filter(user=for_user, event__in=self.events)
+        return EventViewer.objects.filter(user=for_user, event__in=self.events.all())
 
     @property
     def curr_event(self):
-        curr_time = timezone.now()
-        return self.events.filter(start_at__lte=curr_time, end_at__gte=curr_time).first()
+        """ Event taking place now, cached until it ends or until the next event of the user starts. """
+        def get_curr_event():
+            curr_time = timezone.now()
+            events = self.events.filter(end_at__gte=curr_time).order_by("start_at")
+            curr_event = events.filter(start_at__lte=curr_time).first()
+            if curr_event is not None:
+                return curr_event, curr_event.end_at
+            next_event = events.first()
+            return None, next_event.start_at if next_event is not None else None
+
+        def valid_for(value) -> int:
+            valid_until = value[1]
+            if valid_until is None:
+                return CACHE_TIMEOUT
+            return max(1, min(CACHE_TIMEOUT, int((valid_until - timezone.now()).total_seconds())))
+
+        return read_through("user", self.pk, "curr_event", get_curr_event, timeout=valid_for)[0]
 
     def check_nsfw_profile_picture(self):
-        categories, is_nsfw = check_nsfw_photo_aws(self.profile_key)
+        categories, is_nsfw = get_moderation_backend().check_photo(self.profile_key)
         if is_nsfw:
             self.profile = default_profile_picture()
             self.save()
@@ -0,0 +1,38 @@
+from django.db.models import QuerySet, Case, When, Value, Exists, OuterRef, Subquery, Count
+from django.db.models.functions import Coalesce, Least
+
+from user.models import User
+from utils.pagination import rank_key
+
+EXACT_MATCH_SCORE = 100
+FRIEND_SCORE = 50
+MUTUAL_FRIENDS_MAX_SCORE = 49
+
+SEARCH_ORDERING = ("search_rank",)
+
+
+def search_users(user: User, term: str, fast: bool = False) -> QuerySet[User]:
+    """
+    Users whose username starts with the term (case insensitive, served by the username search index),
+    annotated with "relevance" and "search_rank", its unique cursor position, to be ordered by SEARCH_ORDERING.
+    Exact matches come first then friends then friends of friends by mutual friends count,
+    the fast path only ranks exact matches for search as you type.
+    """
+    from friendship.models import FriendshipEdge
+
+    users = User.objects.filter(username__istartswith=term).exclude(pk=user.pk)
+    relevance = Case(When(username__iexact=term, then=Value(EXACT_MATCH_SCORE)), default=Value(0))
+    if fast:
+        return users.annotate(relevance=relevance).annotate(search_rank=rank_key("relevance", "username"))
+
+    is_friend = Exists(FriendshipEdge.objects.filter(user=user, friend=OuterRef("pk")))
+    mutual_friends_count = Coalesce(Subquery(
+        FriendshipEdge.objects.filter(
+            friend=OuterRef("pk"), user__friend_edges__user=user
+        ).order_by().values("friend").annotate(count=Count("pk")).values("count")
+    ), 0)
+    return users.annotate(
+        relevance=relevance
+        + Case(When(is_friend, then=Value(FRIEND_SCORE)), default=Value(0))
+        + Least(mutual_friends_count, Value(MUTUAL_FRIENDS_MAX_SCORE))
+    ).annotate(search_rank=rank_key("relevance", "username"))
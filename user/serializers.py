@@ -1,7 +1,13 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from abc import ABC, ABCMeta, abstractmethod
+
+from django.db.models import Manager
+from rest_framework.serializers import ModelSerializer, ListSerializer, SerializerMetaclass, SerializerMethodField
 
 from user.models import User
-from friendship.status import get_friendship_status
+from friendship.status import get_friendship_statuses
+
+
+MUTUAL_FRIENDS_PREVIEW_COUNT = 3
 
 
 class CreateUserSerializer(ModelSerializer):
@@ -58,10 +64,38 @@ class UserSerializer(ModelSerializer):
         return "https://www.alexgrey.com/img/containers/art_images/Godself-2012-Alex-Grey-watermarked.jpeg/121e98270df193e56eeaebcff787023f.jpeg"
 
 
-class UserPOVSerializer(UserSerializer):
+class UserContextualListSerializer(ListSerializer):
+    """ Loads the context data of all users in the list at once. """
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, Manager) else data)
+        self.child.load_context_data(users)
+        return super().to_representation(users)
+
+
+class UserContextDataMeta(ABCMeta, SerializerMetaclass):
+    """ Lets serializers mix in the abstract UserContextDataMixin. """
+
+
+class UserContextDataMixin(ABC, metaclass=UserContextDataMeta):
+    """ Per user data shared through the serializer context, loaded for whole lists by UserContextualListSerializer. """
+
+    @abstractmethod
+    def load_context_data(self, users: list[User]):
+        """ Fills the context with the data of every user, keyed by user id. """
+        raise NotImplementedError
+
+    def get_context_data(self, key: str, obj: User):
+        if obj.pk not in self.context.get(key, {}):
+            self.load_context_data([obj])
+        return self.context[key][obj.pk]
+
+
+class UserPOVSerializer(UserContextDataMixin, UserSerializer):
     friendship_status = SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
+        list_serializer_class = UserContextualListSerializer
         fields = [
             *UserSerializer.Meta.fields,
             "friendship_status"
@@ -71,11 +105,11 @@ class UserPOVSerializer(UserSerializer):
         self.user_pov = kwargs.pop("user_pov")
         super().__init__(*args, **kwargs)
 
+    def load_context_data(self, users: list[User]):
+        self.context.setdefault("friendship_status", {}).update(get_friendship_statuses(self.user_pov, users))
+
     def get_friendship_status(self, obj):
-        return get_friendship_status(
-            user_from=self.user_pov,
-            user_to=obj
-        ).value
+        return self.get_context_data("friendship_status", obj).value
 
 
 class MiniUserSerializer(ModelSerializer):
@@ -91,35 +125,59 @@ class MiniUserSerializer(ModelSerializer):
         ]
 
 
-class MiniUserContextualSerializer(MiniUserSerializer):
+class UserSearchResultSerializer(ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = [
+            "id",
+            "username",
+            "profile"
+        ]
+
+
+class MiniUserContextualSerializer(UserContextDataMixin, MiniUserSerializer):
     friendship_status = SerializerMethodField()
     mutual_friends = SerializerMethodField()
+    mutual_friends_count = SerializerMethodField()
 
     class Meta(MiniUserSerializer.Meta):
+        list_serializer_class = UserContextualListSerializer
         read_only_fields = fields = [
             *MiniUserSerializer.Meta.fields,
             "friendship_status",
             "mutual_friends",
+            "mutual_friends_count",
         ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.auth_user = self.context.get("request").user
 
+    def load_context_data(self, users: list[User]):
+        from friendship.models import FriendshipEdge
+
+        mutual_friends = FriendshipEdge.objects.mutual_friends_for(
+            self.auth_user, [user.pk for user in users], limit=MUTUAL_FRIENDS_PREVIEW_COUNT
+        )
+        self.context.setdefault("mutual_friends", {}).update({
+            user.pk: mutual_friends.get(user.pk, (0, [])) for user in users
+        })
+        self.context.setdefault("friendship_status", {}).update(get_friendship_statuses(self.auth_user, users))
+
     def get_friendship_status(self, obj):
-        return get_friendship_status(user_from=self.auth_user, user_to=obj).value
+        return self.get_context_data("friendship_status", obj).value
 
     def get_mutual_friends(self, obj):
-        return [
-            MiniUserSerializer(instance=friend).data
-            for friend in obj.mutual_friends(self.auth_user)
-        ]
+        count, mutual_friends = self.get_context_data("mutual_friends", obj)
+        return MiniUserSerializer(instance=mutual_friends, many=True).data
+
+    def get_mutual_friends_count(self, obj):
+        count, mutual_friends = self.get_context_data("mutual_friends", obj)
+        return count
 
 
 class UserContextualSerializer(MiniUserContextualSerializer):
-    events_count = SerializerMethodField()
-    friends_count = SerializerMethodField()
-    flashbacks_count = SerializerMethodField()
 
     class Meta(MiniUserContextualSerializer.Meta):
         read_only_fields = fields = [
@@ -129,15 +187,6 @@ class UserContextualSerializer(MiniUserContextualSerializer):
             "flashbacks_count"
         ]
 
-    def get_events_count(self, obj: User):
-        return obj.events.count()
-
-    def get_friends_count(self, obj: User):
-        return obj.friends.count()
-
-    def get_flashbacks_count(self, obj: User):
-        return obj.flashbacks.count()
-
 
 class UpdateProfilePicture(ModelSerializer):
 
@@ -149,9 +198,6 @@ class UpdateProfilePicture(ModelSerializer):
 
 
 class AuthMiniUserSerializer(MiniUserSerializer):
-    events_count = SerializerMethodField()
-    friends_count = SerializerMethodField()
-    flashbacks_count = SerializerMethodField()
 
     class Meta(MiniUserSerializer.Meta):
         read_only_fields = fields = [
@@ -161,13 +207,3 @@ class AuthMiniUserSerializer(MiniUserSerializer):
             "flashbacks_count",
             "date_joined",
         ]
-
-    def get_events_count(self, obj: User):
-        return obj.events.count()
-
-    def get_friends_count(self, obj: User):
-        return obj.friends.count()
-
-    def get_flashbacks_count(self, obj: User):
-        return obj.flashbacks.count()
-
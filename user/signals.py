@@ -1,10 +1,76 @@
-from django.db.models import signals
+from django.db import transaction
+from django.db.models import F, signals
+from django.db.models.functions import Greatest
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from user.models import User
+from utils.cache import invalidate
 
 
 @receiver(signals.post_save, sender=User)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+
+""" Stats counters """
+
+def update_stats(users, field: str, delta: int):
+    users.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+@receiver(signals.post_save, sender="event.EventMember")
+def event_member_created(sender, instance, created, **kwargs):
+    if created:
+        update_stats(User.objects.filter(pk=instance.user_id), "events_count", 1)
+
+
+@receiver(signals.post_delete, sender="event.EventMember")
+def event_member_deleted(sender, instance, **kwargs):
+    update_stats(User.objects.filter(pk=instance.user_id), "events_count", -1)
+
+
+@receiver(signals.post_save, sender="friendship.Friendship")
+def friendship_created(sender, instance, created, **kwargs):
+    if created:
+        update_stats(User.objects.filter(pk__in=[instance.from_user_id, instance.to_user_id]), "friends_count", 1)
+
+
+@receiver(signals.post_delete, sender="friendship.Friendship")
+def friendship_deleted(sender, instance, **kwargs):
+    update_stats(User.objects.filter(pk__in=[instance.from_user_id, instance.to_user_id]), "friends_count", -1)
+
+
+@receiver(signals.post_save, sender="event.Flashback")
+def flashback_created(sender, instance, created, **kwargs):
+    if created:
+        update_stats(User.objects.filter(eventmember=instance.event_member_id), "flashbacks_count", 1)
+
+
+@receiver(signals.post_delete, sender="event.Flashback")
+def flashback_deleted(sender, instance, **kwargs):
+    update_stats(User.objects.filter(eventmember=instance.event_member_id), "flashbacks_count", -1)
+
+
+""" Cache invalidation """
+
+def invalidate_users(*user_ids):
+    transaction.on_commit(lambda: invalidate("user", *user_ids))
+
+
+@receiver(signals.post_save, sender="event.EventMember")
+@receiver(signals.post_delete, sender="event.EventMember")
+def event_member_changed(sender, instance, **kwargs):
+    invalidate_users(instance.user_id)
+
+
+@receiver(signals.post_save, sender="friendship.Friendship")
+@receiver(signals.post_delete, sender="friendship.Friendship")
+def friendship_changed(sender, instance, **kwargs):
+    invalidate_users(instance.from_user_id, instance.to_user_id)
+
+
+@receiver(signals.post_save, sender="event.Event")
+def event_changed(sender, instance, created, **kwargs):
+    if not created:  # dates of the event may have moved, curr_event of its members is stale
+        invalidate_users(*instance.eventmember_set.values_list("user_id", flat=True))
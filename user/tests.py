@@ -1,3 +1,120 @@
-from django.test import TestCase
+import io
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from event.models import Event, EventMember, Flashback
+from friendship.models import Friendship
+from user.models import User
+from user.search import search_users
+from user.serializers import MiniUserSerializer, UserContextDataMixin
+from utils.pagination import DefaultCursorPagination
+
+
+def create_user(username: str) -> User:
+    return User.objects.create(username=username, email=f"{username}@flashback.test")
+
+
+class UserSearchTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = create_user("me")
+        self.exact = create_user("ab")
+        self.others = [create_user(f"ab{i:02}") for i in range(70)]
+        self.friends = self.others[40:43]
+        for friend in self.friends:
+            Friendship.objects.create(from_user=self.user, to_user=friend)
+        self.client.force_authenticate(self.user)
+
+    def get_all_pages(self, url: str) -> list[int]:
+        ids = []
+        for _ in range(10):  # a cursor stuck on ties never ends
+            if url is None:
+                break
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [user["id"] for user in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    @mock.patch.object(DefaultCursorPagination, "offset_cutoff", 5)  # most results tie on their relevance
+    def test_cursor_pages_ranked_results_once(self):
+        for fast in ("false", "true"):
+            ids = self.get_all_pages(f"/api/user/users/search/?q=AB&fast={fast}")
+            self.assertEqual(len(ids), len(set(ids)))
+            self.assertEqual(set(ids), {self.exact.pk} | {user.pk for user in self.others})
+            self.assertEqual(ids[0], self.exact.pk)
+            if fast == "false":
+                self.assertEqual(set(ids[1:4]), {friend.pk for friend in self.friends})
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite query plan")
+    def test_prefix_search_uses_username_index(self):
+        sql, params = search_users(self.user, "ab", fast=True).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("user_username_nocase_idx", plan)
+
+
+class UserContextDataMixinTestCase(APITestCase):
+
+    def test_serializer_without_context_data_cannot_be_created(self):
+        class IncompleteSerializer(UserContextDataMixin, MiniUserSerializer):
+            pass
+
+        user = create_user("me")
+        with self.assertRaises(TypeError):
+            IncompleteSerializer(user)
+        with self.assertRaises(TypeError):
+            IncompleteSerializer([user], many=True)
+
+
+class UserStatsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user, self.friend = create_user("me"), create_user("friend")
+        now = timezone.now()
+        self.event = Event.objects.create(
+            title="party", emoji="🎉", start_at=now, end_at=now + timezone.timedelta(days=1)
+        )
+
+    def get_stats(self, user: User) -> tuple[int, int, int]:
+        user.refresh_from_db(fields=["events_count", "friends_count", "flashbacks_count"])
+        return user.events_count, user.friends_count, user.flashbacks_count
+
+    def test_friendship_counters(self):
+        friendship = Friendship.objects.create(from_user=self.user, to_user=self.friend)
+        self.assertEqual(self.get_stats(self.user), (0, 1, 0))
+        self.assertEqual(self.get_stats(self.friend), (0, 1, 0))
+
+        friendship.delete()
+        self.assertEqual(self.get_stats(self.user), (0, 0, 0))
+        self.assertEqual(self.get_stats(self.friend), (0, 0, 0))
+
+    def test_membership_counters(self):
+        member = EventMember.objects.create(event=self.event, user=self.user)
+        Flashback.objects.create(event_member=member)
+        self.assertEqual(self.get_stats(self.user), (1, 0, 1))
+
+        member.delete()
+        self.assertEqual(self.get_stats(self.user), (0, 0, 0))
+
+    def test_reconcile_repairs_drifted_counters(self):
+        Friendship.objects.create(from_user=self.user, to_user=self.friend)
+        EventMember.objects.create(event=self.event, user=self.user)
+        User.objects.filter(pk=self.user.pk).update(events_count=5, friends_count=0)
+
+        self.assertEqual(User.objects.reconcile_stats(), 1)
+        self.assertEqual(self.get_stats(self.user), (1, 1, 0))
+        self.assertEqual(self.get_stats(self.friend), (0, 1, 0))
+        self.assertEqual(User.objects.reconcile_stats(), 0)
+
+    def test_reconcile_command(self):
+        User.objects.filter(pk=self.friend.pk).update(flashbacks_count=3)
+        output = io.StringIO()
+        call_command("reconcile_user_stats", stdout=output)
+        self.assertIn("Stats of 1 users reconciled.", output.getvalue())
+        self.assertEqual(self.get_stats(self.friend), (0, 0, 0))
@@ -8,16 +8,19 @@ from user.serializers import (CreateUserSerializer,
                               UserContextualSerializer,
                               MiniUserSerializer,
                               MiniUserContextualSerializer,
+                              UserSearchResultSerializer,
                               UpdateProfilePicture,
                               AuthMiniUserSerializer,
                               UpdateUserSerializer)
 
 from user.models import User
+from user.search import search_users, SEARCH_ORDERING
 from user.utils import validate_google_token, get_username_from_email
 from user.notifications import get_notifications_data_for_user, notifications_exists
 from friendship.models import Friendship, FriendRequest
 from friendship.serializers import FriendRequestSerializer
-from utils.mixins import SearchAPIMixin
+from utils.mixins import SearchAPIMixin, ListResponseMixin
+from utils.views import parse_boolean_value
 from event.serializers import EventViewerSerializer
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from user.tasks import check_nsfw_user_profile_picture
@@ -47,9 +50,13 @@ def google_auth(request):
     return Response(data, status=status.HTTP_201_CREATED)
 
 
-class AuthUserViewSet(viewsets.GenericViewSet):
+class AuthUserViewSet(ListResponseMixin, viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    cursor_ordering = {
+        "requests": ("-date", "-pk"),
+        "friends": ("username", "pk"),
+    }
 
     @action(detail=False, methods=["get"])
     def me(self, request):
@@ -63,15 +70,12 @@ class AuthUserViewSet(viewsets.GenericViewSet):
 
     @action(detail=False, methods=["get"])
     def requests(self, request):
-        instance = FriendRequest.objects.filter(to_user=self.request.user)
-        serializer = FriendRequestSerializer(instance=instance, many=True)
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        instance = FriendRequest.objects.filter(to_user=self.request.user).select_related("from_user", "to_user")
+        return self.list_response(instance, serializer_class=FriendRequestSerializer)
 
     @action(detail=False, methods=["get"])
     def friends(self, request):
-        instance = request.user.friends
-        serializer = UserContextualSerializer(instance=instance, many=True, context={"request": request})
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        return self.list_response(request.user.friends, serializer_class=UserContextualSerializer)
 
     @action(detail=False, methods=["get"])
     def notifications(self, request):
@@ -103,14 +107,27 @@ class AuthUserViewSet(viewsets.GenericViewSet):
 
 class UserViewSet(SearchAPIMixin, viewsets.ModelViewSet):
     search_fields = ["username"]
+    cursor_ordering = {
+        "list": ("username", "pk"),
+        "search": SEARCH_ORDERING,
+        "viewers": ("-pk",),
+    }
+
+    @property
+    def fast_search(self) -> bool:
+        """ ?fast=true skips social ranking and contextual data, for search as you type. """
+        return parse_boolean_value(self.request.query_params.get("fast"), default=False)
 
     def get_queryset(self):
         return User.objects.all().exclude(pk=self.request.user.pk)
 
+    def get_search_query(self, search_term):
+        return search_users(self.request.user, search_term, fast=self.fast_search)
+
     def get_serializer_class(self):
         if self.action == "create": return CreateUserSerializer
         if self.action == "requests": return FriendRequestSerializer
-        if self.action == "search": return MiniUserContextualSerializer
+        if self.action == "search": return UserSearchResultSerializer if self.fast_search else MiniUserContextualSerializer
         if self.action == "viewers": return EventViewerSerializer
         return UserContextualSerializer
 
@@ -185,6 +202,5 @@ class UserViewSet(SearchAPIMixin, viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        queryset = instance.viewers_for_user(for_user=request.user)
-        serializer = self.get_serializer(instance=queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        queryset = instance.viewers_for_user(for_user=request.user).with_feed_data()
+        return self.list_response(queryset)
@@ -1,3 +1,5 @@
 from django.contrib import admin
+from utils import models
 
-# Register your models here.
+
+admin.site.register(models.ModerationHash)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class UtilsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'utils'
+
+    def ready(self) -> None:
+        from utils import signals
+        post_migrate.connect(signals.repair_fulltext_indexes_after_migrate, sender=self)
+        return super().ready()
@@ -0,0 +1,74 @@
+"""
+Versioned read-through cache on the default cache. Invalidation only reaches the processes sharing
+that cache: the locmem fallback of DEBUG (no REDIS_CACHE_URL) is per process, so a dev setup running
+several workers (celery, daphne) can serve stale values until they expire, set REDIS_CACHE_URL there.
+"""
+import random
+from typing import Any, Callable, Union
+
+from django.core.cache import cache
+
+CACHE_TIMEOUT = 60 * 15
+STATS_KEY = "stats:{kind}:{name}"
+STATS_SAMPLE_RATE = 100  # one read out of it is counted, the counts are estimates
+CACHED_NAMES = ["friend_ids", "event_ids", "curr_event", "viewer_ids"]  # for stats
+
+_missing = object()
+
+
+def _version_key(scope: str, pk) -> str:
+    return f"version:{scope}:{pk}"
+
+
+def get_version(scope: str, pk) -> int:
+    return cache.get(_version_key(scope, pk), 0)
+
+
+def invalidate(scope: str, *pks):
+    """ Bumps the versions of the scopes (e.g. "user", "event"), orphaning their cached entries until they expire. """
+    for pk in pks:
+        try: cache.incr(_version_key(scope, pk))
+        except ValueError: cache.set(_version_key(scope, pk), 1, timeout=None)
+
+
+def _count(kind: str, name: str):
+    if random.randrange(STATS_SAMPLE_RATE):
+        return
+    key = STATS_KEY.format(kind=kind, name=name)
+    try: cache.incr(key)
+    except ValueError: cache.set(key, 1, timeout=None)
+
+
+def read_through(scope: str, pk, name: str, compute: Callable[[], Any],
+                 timeout: Union[int, Callable[[Any], int]] = CACHE_TIMEOUT) -> Any:
+    """
+    Cached value of `name` for the scope, computed and stored on a miss.
+    Entries are keyed with the version of the scope so `invalidate` drops all of them at once,
+    timeout can be a function of the computed value.
+    """
+    key = f"{scope}:{pk}:{name}:{get_version(scope, pk)}"
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        _count("hits", name)
+        return value
+
+    _count("misses", name)
+    value = compute()
+    cache.set(key, value, timeout=timeout(value) if callable(timeout) else timeout)
+    return value
+
+
+def get_stats(names: list[str] = CACHED_NAMES) -> dict[str, tuple[int, int]]:
+    """ Maps every name to its estimated (hits, misses) counts. """
+    keys = [STATS_KEY.format(kind=kind, name=name) for name in names for kind in ("hits", "misses")]
+    counts = cache.get_many(keys)
+    return {
+        name: tuple(
+            counts.get(STATS_KEY.format(kind=kind, name=name), 0) * STATS_SAMPLE_RATE for kind in ("hits", "misses")
+        )
+        for name in names
+    }
+
+
+def reset_stats(names: list[str] = CACHED_NAMES):
+    cache.delete_many([STATS_KEY.format(kind=kind, name=name) for name in names for kind in ("hits", "misses")])
@@ -0,0 +1,127 @@
+import re
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+FULLTEXT_CONFIG = "simple"  # no stemming, content is short and multilingual
+FULLTEXT_COLUMN = "search_vector"
+FULLTEXT_TRIGGERS = ("ai", "ad", "au")
+SYMBOLS_PATTERN = r"[^\w\s\x00-\x7f]+"  # emoji and other symbols the tokenizers drop
+
+
+def fulltext_table(table: str) -> str:
+    return f"{table}_fts"
+
+
+def create_fulltext_index(schema_editor, table: str, columns: list[str]):
+    """
+    Full text index of the columns of the table, to be run from a RunPython migration.
+    PostgreSQL gets a generated tsvector column with a GIN index, SQLite an FTS5 table kept in sync by triggers.
+    SQLite drops the triggers when django remakes the table, repair_fulltext_indexes restores them after migrate.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {FULLTEXT_COLUMN} tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{FULLTEXT_CONFIG}', {document})) STORED"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_fts_idx ON {table} USING gin ({FULLTEXT_COLUMN})"
+        )
+    elif vendor == "sqlite":
+        fts = fulltext_table(table)
+        names = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+        delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+        insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});"
+
+        drop_fulltext_index(schema_editor, table)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        schema_editor.execute(f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END")
+        schema_editor.execute(f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END")
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_fulltext_index(schema_editor, table: str):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_fts_idx")
+        schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS {FULLTEXT_COLUMN}")
+    elif vendor == "sqlite":
+        fts = fulltext_table(table)
+        for trigger in FULLTEXT_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def repair_fulltext_indexes(connection):
+    """
+    Recreates the SQLite triggers of every full text index whose table was remade by a migration,
+    the FTS5 table survives the remake and tells the indexed columns. PostgreSQL keeps its generated column.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    tables = set(connection.introspection.table_names())
+    for table in sorted(tables):
+        fts = fulltext_table(table)
+        if fts not in tables:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s AND name IN (%s, %s, %s)",
+                [table, *(f"{fts}_{trigger}" for trigger in FULLTEXT_TRIGGERS)]
+            )
+            if cursor.fetchone()[0] == len(FULLTEXT_TRIGGERS):
+                continue
+            cursor.execute(f"PRAGMA table_info({fts})")
+            columns = [row[1] for row in cursor.fetchall()]
+        with connection.schema_editor() as schema_editor:
+            create_fulltext_index(schema_editor, table, columns)
+
+
+def fulltext_filter(queryset: QuerySet, term: str, model=None, lookup: str = "pk",
+                    symbol_fields: list[str] = ()) -> QuerySet:
+    """
+    Filters the queryset to rows whose `lookup` is a row of the model (queryset model by default)
+    matching every word of the term as a prefix, the match runs inside the query on the full text index.
+    Symbols of the term (emoji) are not indexed, they have to be contained in one of the symbol_fields.
+    """
+    words = re.findall(r"\w+", term or "")
+    symbols = "".join(re.findall(SYMBOLS_PATTERN, term or ""))
+    if not symbol_fields:
+        symbols = ""
+    if not words and not symbols:
+        return queryset.none()
+
+    if symbols:
+        symbols_query = Q()
+        for field in symbol_fields:
+            symbols_query |= Q(**{f"{field}__contains": symbols})
+        queryset = queryset.filter(symbols_query)
+    if not words:
+        return queryset
+
+    table = (model or queryset.model)._meta.db_table
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        matches = RawSQL(
+            f"SELECT id FROM {table} WHERE {FULLTEXT_COLUMN} @@ to_tsquery('{FULLTEXT_CONFIG}', %s)",
+            [" & ".join(f"{word}:*" for word in words)]
+        )
+    elif vendor == "sqlite":
+        fts = fulltext_table(table)
+        matches = RawSQL(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s",
+            [" ".join(f'"{word}"*' for word in words)]
+        )
+    else:
+        raise NotImplementedError(f"Full text search is not supported on {vendor}.")
+    return queryset.filter(**{f"{lookup}__in": matches})
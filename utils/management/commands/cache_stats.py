@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from utils.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Display estimated hit/miss counts of the read-through cache (sampled)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counts after displaying them")
+
+    def handle(self, *args, **kwargs):
+        for name, (hits, misses) in get_stats().items():
+            total = hits + misses
+            ratio = f"{hits / total:.1%}" if total else "-"
+            self.stdout.write(f"{name}: ~{hits} hits, ~{misses} misses ({ratio})")
+        if kwargs["reset"]:
+            reset_stats()
@@ -1,56 +1,118 @@
-import boto3
-import ffmpeg
-import os
-import uuid
 import io
+import subprocess
+import uuid
 
+import boto3
+import ffmpeg
+from PIL import Image
 from django.conf import settings
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.base import ContentFile
+
+THUMBNAIL_SEEK = 1.0  # seconds, the first frames are often black or a fade in
+THUMBNAIL_TIMEOUT = 60  # seconds, whole ffmpeg run
+THUMBNAIL_IO_TIMEOUT = 15  # seconds, stalled reads of the video
+THUMBNAIL_MAX_SIZE = 1920
+THUMBNAIL_QUALITY = 85
+INVALID_INPUT_ERRORS = (  # ffmpeg errors of the upload itself, another attempt fails the same way
+    "Invalid data found when processing input",
+    "moov atom not found",
+    "does not contain any stream",
+    "matches no streams",
+    "could not find codec parameters",
+    "Decoder not found",
+)
+
+
+class ThumbnailError(Exception):
+    """ Thumbnail extraction failure, reason is one of REASONS and retryable tells if another attempt may succeed. """
+    TIMEOUT = "timeout"
+    FFMPEG = "ffmpeg"
+    INVALID_INPUT = "invalid_input"
+    NO_FRAME = "no_frame"
+    DECODE = "decode"
+    REASONS = (TIMEOUT, FFMPEG, INVALID_INPUT, NO_FRAME, DECODE)
 
+    def __init__(self, reason: str, message: str = "", retryable: bool = False):
+        super().__init__(f"{reason}: {message}" if message else reason)
+        self.reason = reason
+        self.retryable = retryable
 
-def generate_video_thumbnail(video_path):
+
+def get_presigned_url(media_path: str, expires_in: int = 3600) -> str:
     s3 = boto3.client(
         's3',
         aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
         region_name=settings.AWS_DEFAULT_REGION
     )
-
-    signed_url = s3.generate_presigned_url(
+    return s3.generate_presigned_url(
         'get_object',
         Params={
             'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
-            'Key': video_path
+            'Key': media_path
         },
-        ExpiresIn=3600
+        ExpiresIn=expires_in
     )
 
-    thumbnail_path = f"media/private/flashback/{uuid.uuid4()}.jpg"
-    temp_file_path = f"{settings.DATAFILES_DIR}/{uuid.uuid4()}.jpg"
 
-    try: ffmpeg.input(signed_url, ss=0).output(temp_file_path, vframes=1, format='image2', update=1).run()
-    except Exception as e:
-        print("Exception while generating thumbnail: ", e)
+def _read_keyframe(url: str, seek: float) -> bytes:
+    """
+    JPEG of the keyframe at or before `seek` read from ffmpeg's stdout, the input-side seek jumps
+    to the keyframe without decoding what precedes it and only keyframes are decoded.
+    """
+    args = (
+        ffmpeg
+        .input(url, ss=seek, noaccurate_seek=None, skip_frame="nokey", rw_timeout=THUMBNAIL_IO_TIMEOUT * 10 ** 6)
+        .output("pipe:1", vframes=1, format="image2pipe", vcodec="mjpeg", **{"q:v": 2})
+        .global_args("-v", "error", "-nostdin")
+        .compile()
+    )
+    try:
+        process = subprocess.run(args, capture_output=True, timeout=THUMBNAIL_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise ThumbnailError(ThumbnailError.TIMEOUT, f"ffmpeg ran for more than {THUMBNAIL_TIMEOUT}s", retryable=True)
+    except OSError as e:
+        raise ThumbnailError(ThumbnailError.FFMPEG, str(e), retryable=True)
+    if process.returncode != 0:
+        stderr = process.stderr.decode("utf-8", errors="replace").strip()
+        if any(error.lower() in stderr.lower() for error in INVALID_INPUT_ERRORS):
+            raise ThumbnailError(ThumbnailError.INVALID_INPUT, stderr[-500:])
+        raise ThumbnailError(ThumbnailError.FFMPEG, stderr[-500:], retryable=True)
+    return process.stdout
 
-    upload_image: InMemoryUploadedFile
 
+def extract_video_frame(video_path: str) -> Image.Image:
+    """ Representative frame of the video, the first one when the video is shorter than THUMBNAIL_SEEK. """
+    url = get_presigned_url(video_path)
+    try:
+        data = _read_keyframe(url, THUMBNAIL_SEEK)
+    except ThumbnailError as e:  # seeking past the end of a short video can fail too
+        if e.reason == ThumbnailError.TIMEOUT:
+            raise
+        data = b""
+    data = data or _read_keyframe(url, 0)
+    if not data:
+        raise ThumbnailError(ThumbnailError.NO_FRAME, "the video has no frame")
     try:
-        with open(temp_file_path, 'rb') as img_file:
-            image_data = img_file.read()
-            image_in_memory = io.BytesIO(image_data)
-
-            uploaded_image = InMemoryUploadedFile(
-                image_in_memory,
-                None,
-                thumbnail_path,
-                'image/jpeg',  # Mime type
-                len(image_data),  # File size
-                None  # Charset
-            )
+        image = Image.open(io.BytesIO(data))
+        image.load()
     except Exception as e:
-        print("Exception while reading thumbnail: ", e)
+        raise ThumbnailError(ThumbnailError.DECODE, str(e))
+    return image.convert("RGB")
+
+
+def generate_video_thumbnails(video_path: str, sizes: dict[str, int]) -> dict[str, ContentFile]:
+    """ JPEG thumbnails fitting in each size (largest side) from a single frame extraction. """
+    frame = extract_video_frame(video_path)
+    thumbnails = {}
+    for name, size in sizes.items():
+        image = frame.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        thumbnails[name] = ContentFile(buffer.getvalue(), name=f"{uuid.uuid4()}.jpg")
+    return thumbnails
 
-    if os.path.exists(temp_file_path):
-        os.remove(temp_file_path)
 
-    return uploaded_image
+def generate_video_thumbnail(video_path: str) -> ContentFile:
+    return generate_video_thumbnails(video_path, {"media": THUMBNAIL_MAX_SIZE})["media"]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk0', models.PositiveIntegerField(db_index=True)),
+                ('chunk1', models.PositiveIntegerField(db_index=True)),
+                ('chunk2', models.PositiveIntegerField(db_index=True)),
+                ('chunk3', models.PositiveIntegerField(db_index=True)),
+                ('categories', models.JSONField(default=dict)),
+                ('is_nsfw', models.BooleanField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('chunk0', 'chunk1', 'chunk2', 'chunk3')},
+            },
+        ),
+    ]
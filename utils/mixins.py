@@ -3,10 +3,36 @@ from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from utils.streaming import stream_json_list
+from utils.views import parse_boolean_value
 
-class SearchAPIMixin:
+
+class ListResponseMixin:
+    """
+    Paginated response for list and list like actions,
+    staff users can get the whole list streamed with ?stream=true (exports).
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def list_response(self, queryset, serializer_class=None, **serializer_kwargs):
+        serializer_class = serializer_class or self.get_serializer_class()
+        serializer_kwargs.setdefault("context", self.get_serializer_context())
+
+        stream = parse_boolean_value(self.request.query_params.get("stream"), default=False)
+        if stream and self.request.user.is_staff:
+            return stream_json_list(queryset, serializer_class, context=serializer_kwargs["context"])
+
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serializer_class(queryset, many=True, **serializer_kwargs).data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer_class(page, many=True, **serializer_kwargs).data)
+
+
+class SearchAPIMixin(ListResponseMixin):
+    """ Paginated ?q= search, results are ordered by the "search" entry of `cursor_ordering`. """
     search_fields = []
-    search_data_sort = None
 
     def get_search_query(self, search_term):
         search_query = Q()
@@ -21,9 +47,4 @@ class SearchAPIMixin:
         if not search_query:
             return Response({"detail": "Search query is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        query = self.get_search_query(search_term=search_query)
-        data = self.get_serializer(query, many=True).data
-        if self.search_data_sort is not None:
-            data = sorted(data, key=self.search_data_sort)
-
-        return Response(data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return self.list_response(self.get_search_query(search_term=search_query))
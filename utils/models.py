@@ -1,3 +1,52 @@
 from django.db import models
 
-# Create your models here.
+from utils.perceptual_hash import CHUNKS_COUNT, split_hash, join_hash, chunk_neighbours, hamming_distance
+
+
+class ModerationHashQuerySet(models.QuerySet):
+
+    def find_similar(self, value: int, threshold: int):
+        """
+        Closest moderated media within the hamming distance threshold, looked up by multi-index hashing:
+        two hashes that close have a chunk within threshold // CHUNKS_COUNT of each other.
+        """
+        radius = threshold // CHUNKS_COUNT
+        query = models.Q()
+        for i, chunk in enumerate(split_hash(value)):
+            query |= models.Q(**{f"chunk{i}__in": chunk_neighbours(chunk, radius)})
+
+        best, best_distance = None, threshold + 1
+        for candidate in self.filter(query):
+            distance = hamming_distance(value, candidate.hash)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+    def record(self, value: int, categories: dict, is_nsfw: bool):
+        chunks = split_hash(value)
+        self.bulk_create([
+            ModerationHash(**{f"chunk{i}": chunk for i, chunk in enumerate(chunks)}, categories=categories, is_nsfw=is_nsfw)
+        ], ignore_conflicts=True)
+
+
+class ModerationHash(models.Model):
+    """ Moderation verdict of a media by its 64 bits perceptual hash, stored as 16 bits chunks each indexed. """
+    objects = ModerationHashQuerySet.as_manager()
+
+    chunk0 = models.PositiveIntegerField(db_index=True)
+    chunk1 = models.PositiveIntegerField(db_index=True)
+    chunk2 = models.PositiveIntegerField(db_index=True)
+    chunk3 = models.PositiveIntegerField(db_index=True)
+    categories = models.JSONField(default=dict)
+    is_nsfw = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("chunk0", "chunk1", "chunk2", "chunk3")
+
+    def __str__(self):
+        return f"{self.hash:016x} {'nsfw' if self.is_nsfw else 'safe'}"
+
+    @property
+    def hash(self) -> int:
+        return join_hash([self.chunk0, self.chunk1, self.chunk2, self.chunk3])
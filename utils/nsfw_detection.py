@@ -1,69 +1,213 @@
-from django.conf import settings
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import boto3
+from botocore.config import Config
+from django.conf import settings
+from django.utils.module_loading import import_string
 
+from utils.perceptual_hash import dhash
 
-def _process_result(result):
-    nsfw_labels = ["Explicit Nudity", "Suggestive", "Violence", "Drugs"]
+logger = logging.getLogger(__name__)
+
+NSFW_LABELS = ["Explicit Nudity", "Suggestive", "Violence", "Drugs"]
+NSFW_MIN_CONFIDENCE = 75
 
+
+def _process_result(result):
     categories = {}
     for label in result["ModerationLabels"]:
         is_video = True if label.get("ModerationLabel", None) else False
         label_data = label["ModerationLabel"] if is_video else label
-        if label_data["Name"] in nsfw_labels:
+        if label_data["Name"] in NSFW_LABELS:
             categories[label_data["Name"]] = label_data["Confidence"]
 
-    is_nsfw = any(confidence > 75 for confidence in categories.values())
+    is_nsfw = any(confidence > NSFW_MIN_CONFIDENCE for confidence in categories.values())
 
     return categories, is_nsfw
 
 
-def check_nsfw_photo_aws(media_path):
-    rekognition = boto3.client(
-        'rekognition',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_DEFAULT_REGION # Your region
-    )
-
-    response = rekognition.detect_moderation_labels(
-        Image={"S3Object": {"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Name": media_path}},
-        MinConfidence=75  # Adjust threshold as needed
-    )
-
-    return _process_result(response)
-
-
-def start_video_moderation(media_path):
-    rekognition = boto3.client(
-        'rekognition',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_DEFAULT_REGION
-    )
-
-    response = rekognition.start_content_moderation(
-        Video={
-            'S3Object': {
-                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
-                'Name': media_path
-            }
-        },
-        MinConfidence=75
-    )
-
-    return response['JobId']
-
-
-def get_video_moderation_results(job_id):
-    rekognition = boto3.client(
-        'rekognition',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_DEFAULT_REGION
-    )
-
-    response = rekognition.get_content_moderation(JobId=job_id)
-
-    if response.get("JobStatus") == "SUCCEEDED":
+class ModerationBackend(ABC):
+    """
+    Moderation of media stored under their S3 key, photo checks return (categories, is_nsfw),
+    video checks run as a job whose result is (categories, None) until it finishes.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.MODERATION_MAX_WORKERS, thread_name_prefix="moderation"
+                )
+        return self._executor
+
+    @abstractmethod
+    def detect_photo(self, media_path: str) -> tuple[dict, bool]:
+        """ Remote check of the photo. """
+        raise NotImplementedError
+
+    def read_media(self, media_path: str) -> bytes | None:
+        """ Content of the media for its perceptual hash, None skips the moderation hash cache. """
+        return None
+
+    def get_media_hash(self, media_path: str) -> int | None:
+        try:
+            data = self.read_media(media_path)
+            return dhash(data) if data is not None else None
+        except Exception as e:
+            logger.warning("perceptual hash of %s failed: %r", media_path, e)
+            return None
+
+    def check_photo(self, media_path: str) -> tuple[dict, bool]:
+        result = self.check_photos([media_path])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def check_photos(self, media_paths: list[str]) -> list:
+        """
+        Checks the photos concurrently, every result is (categories, is_nsfw) or the exception raised for it.
+        Photos close enough to an already moderated one get its verdict without a remote check.
+        """
+        from utils.models import ModerationHash
+
+        hashes = [None] * len(media_paths)
+        if settings.MODERATION_HASH_CACHE:
+            hashes = list(self.executor.map(self.get_media_hash, media_paths))
+
+        results, futures = [None] * len(media_paths), {}
+        for i, (media_path, media_hash) in enumerate(zip(media_paths, hashes)):
+            similar = None
+            if media_hash is not None:
+                similar = ModerationHash.objects.find_similar(media_hash, settings.MODERATION_HASH_THRESHOLD)
+            if similar is not None:
+                results[i] = (similar.categories, similar.is_nsfw)
+            else:
+                futures[i] = self.executor.submit(self.detect_photo, media_path)
+
+        for i, future in futures.items():
+            try: results[i] = future.result()
+            except Exception as e:
+                results[i] = e
+                continue
+            if hashes[i] is not None:
+                ModerationHash.objects.record(hashes[i], *results[i])
+        return results
+
+    @abstractmethod
+    def start_video_moderation(self, media_path: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_video_moderation_results(self, job_id: str) -> tuple[dict, bool | None]:
+        raise NotImplementedError
+
+
+class RekognitionModerationBackend(ModerationBackend):
+    """ AWS Rekognition through one client shared by the threads, throttled calls are retried with backoff. """
+
+    def __init__(self):
+        super().__init__()
+        self.client = boto3.client(
+            'rekognition',
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_DEFAULT_REGION,
+            config=Config(
+                retries={"max_attempts": settings.MODERATION_MAX_RETRIES, "mode": "adaptive"},
+                max_pool_connections=settings.MODERATION_MAX_WORKERS,
+            ),
+        )
+        self.s3_client = boto3.client(
+            's3',
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_DEFAULT_REGION,
+            config=Config(max_pool_connections=settings.MODERATION_MAX_WORKERS),
+        )
+
+    def read_media(self, media_path):
+        return self.s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=media_path)["Body"].read()
+
+    def detect_photo(self, media_path):
+        response = self.client.detect_moderation_labels(
+            Image={"S3Object": {"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Name": media_path}},
+            MinConfidence=NSFW_MIN_CONFIDENCE
+        )
         return _process_result(response)
-    return {}, None
+
+    def start_video_moderation(self, media_path):
+        response = self.client.start_content_moderation(
+            Video={
+                'S3Object': {
+                    'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                    'Name': media_path
+                }
+            },
+            MinConfidence=NSFW_MIN_CONFIDENCE
+        )
+        return response['JobId']
+
+    def get_video_moderation_results(self, job_id):
+        response = self.client.get_content_moderation(JobId=job_id)
+        if response.get("JobStatus") == "SUCCEEDED":
+            return _process_result(response)
+        return {}, None
+
+
+class LocalModerationBackend(ModerationBackend):
+    """
+    Deterministic offline stand-in, verdicts come from MODERATION_FIXTURES, a json file mapping the sha256
+    of the media (of its key when it is not found under MODERATION_LOCAL_MEDIA_ROOT) to its nsfw categories.
+    Unknown media are safe, MODERATION_LOCAL_LATENCY simulates the latency of the calls.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.fixtures = {}
+        if settings.MODERATION_FIXTURES:
+            with open(settings.MODERATION_FIXTURES) as file:
+                self.fixtures = json.load(file)
+
+    def read_media(self, media_path):
+        path = os.path.join(settings.MODERATION_LOCAL_MEDIA_ROOT or "", media_path)
+        if settings.MODERATION_LOCAL_MEDIA_ROOT and os.path.isfile(path):
+            with open(path, "rb") as file:
+                return file.read()
+        return None
+
+    def get_fixture_key(self, media_path: str) -> str:
+        data = self.read_media(media_path)
+        return hashlib.sha256(data if data is not None else media_path.encode("utf-8")).hexdigest()
+
+    def get_verdict(self, media_hash: str) -> tuple[dict, bool]:
+        time.sleep(settings.MODERATION_LOCAL_LATENCY)
+        categories = self.fixtures.get(media_hash, {})
+        return categories, any(confidence > NSFW_MIN_CONFIDENCE for confidence in categories.values())
+
+    def detect_photo(self, media_path):
+        return self.get_verdict(self.get_fixture_key(media_path))
+
+    def start_video_moderation(self, media_path):
+        return self.get_fixture_key(media_path)
+
+    def get_video_moderation_results(self, job_id):
+        return self.get_verdict(job_id)
+
+
+@lru_cache(maxsize=None)
+def get_moderation_backend() -> ModerationBackend:
+    """ Backend set by MODERATION_BACKEND, one instance per process. """
+    return import_string(settings.MODERATION_BACKEND)()
@@ -0,0 +1,31 @@
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat, LPad
+from rest_framework.pagination import CursorPagination
+
+RANK_KEY_DIGITS = 10
+
+
+def rank_key(score: str, unique_field: str):
+    """
+    Cursor position of a ranked list, the score (descending) padded and followed by a unique field (ascending).
+    The cursor only keys on its first ordering field, so ranked lists order on this unique
+    and stable value instead of the score, which ties for most rows.
+    """
+    return Concat(
+        LPad(Cast(Value(10 ** RANK_KEY_DIGITS - 1) - F(score), CharField()), RANK_KEY_DIGITS, Value("0")),
+        F(unique_field),
+        output_field=CharField(),
+    )
+
+
+class DefaultCursorPagination(CursorPagination):
+    """
+    Default pagination of the project, ordering of every endpoint
+    can be set by `cursor_ordering` of the view mapping action to ordering.
+    """
+    page_size = 30
+    ordering = "-pk"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "cursor_ordering", {}).get(getattr(view, "action", None), self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
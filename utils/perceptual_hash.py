@@ -0,0 +1,49 @@
+import io
+from itertools import combinations
+
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 differences, 64 bits hash
+CHUNKS_COUNT = 4
+CHUNK_BITS = 64 // CHUNKS_COUNT
+
+
+def dhash(image_data: bytes) -> int:
+    """ Difference hash of the image, every bit tells if a pixel is brighter than its right neighbour. """
+    image = Image.open(io.BytesIO(image_data)).convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left, right = pixels[row * (HASH_SIZE + 1) + col], pixels[row * (HASH_SIZE + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def split_hash(value: int) -> list[int]:
+    """ The hash split in CHUNKS_COUNT chunks of CHUNK_BITS, most significant first. """
+    mask = (1 << CHUNK_BITS) - 1
+    return [(value >> (CHUNK_BITS * (CHUNKS_COUNT - 1 - i))) & mask for i in range(CHUNKS_COUNT)]
+
+
+def join_hash(chunks: list[int]) -> int:
+    value = 0
+    for chunk in chunks:
+        value = (value << CHUNK_BITS) | chunk
+    return value
+
+
+def chunk_neighbours(chunk: int, radius: int) -> list[int]:
+    """ Chunks at a hamming distance of at most radius from the chunk. """
+    neighbours = [chunk]
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), distance):
+            flipped = chunk
+            for bit in bits:
+                flipped ^= 1 << bit
+            neighbours.append(flipped)
+    return neighbours
@@ -0,0 +1,6 @@
+from django.db import connections
+
+
+def repair_fulltext_indexes_after_migrate(sender, using, **kwargs):
+    from utils.fulltext import repair_fulltext_indexes
+    repair_fulltext_indexes(connections[using])
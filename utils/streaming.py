@@ -0,0 +1,29 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+STREAM_CHUNK_SIZE = 500
+
+
+def stream_json_list(queryset, serializer_class, context: dict = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """ JSON array of serialized queryset streamed chunk by chunk, whole list is never held in memory. """
+
+    def serialize_chunk(chunk):
+        data = serializer_class(chunk, many=True, context=context or {}).data
+        return ",".join(json.dumps(item, cls=JSONEncoder) for item in data)
+
+    def generate():
+        yield "["
+        chunk, first = [], True
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(instance)
+            if len(chunk) >= chunk_size:
+                yield ("" if first else ",") + serialize_chunk(chunk)
+                chunk, first = [], False
+        if chunk:
+            yield ("" if first else ",") + serialize_chunk(chunk)
+        yield "]"
+
+    return StreamingHttpResponse(generate(), content_type="application/json")
@@ -1,3 +1,230 @@
-from django.test import TestCase
+import io
+import subprocess
+import tempfile
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image, ImageDraw
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from event.models import Event
+from utils import cache as read_through_cache
+from utils import media
+from utils.fulltext import fulltext_filter, fulltext_table, repair_fulltext_indexes
+from utils.models import ModerationHash
+from utils.nsfw_detection import LocalModerationBackend, ModerationBackend, get_moderation_backend
+
+
+def create_event(title: str, emoji: str) -> Event:
+    now = timezone.now()
+    return Event.objects.create(title=title, emoji=emoji, start_at=now, end_at=now + timezone.timedelta(days=1))
+
+
+class FulltextFilterTestCase(TestCase):
+
+    def setUp(self):
+        self.party = create_event("Summer party", "🎉")
+        self.pizza = create_event("Pizza night", "🍕")
+
+    def search(self, term: str) -> set[int]:
+        return set(fulltext_filter(Event.objects.all(), term, symbol_fields=["emoji"]).values_list("pk", flat=True))
+
+    def test_words_match_prefixes(self):
+        self.assertEqual(self.search("summ PART"), {self.party.pk})
+        self.assertEqual(self.search("summer pizza"), set())
+
+    def test_emoji_match_symbol_fields(self):
+        self.assertEqual(self.search("🍕"), {self.pizza.pk})
+        self.assertEqual(self.search("party 🎉"), {self.party.pk})
+        self.assertEqual(self.search("party 🍕"), set())
+
+    def test_symbols_without_symbol_fields_match_nothing(self):
+        self.assertFalse(fulltext_filter(Event.objects.all(), "🎉").exists())
+        self.assertFalse(fulltext_filter(Event.objects.all(), " !? ").exists())
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite full text triggers")
+class FulltextRepairTestCase(TransactionTestCase):
+
+    def test_triggers_dropped_by_table_remake_are_restored(self):
+        fts = fulltext_table("event_event")
+        with connection.cursor() as cursor:  # what a remake of the table does to them
+            for trigger in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER {fts}_{trigger}")
+        create_event("Lost party", "🎉")
+
+        repair_fulltext_indexes(connection)
+        event = create_event("Found party", "🎉")
+        self.assertEqual(
+            set(fulltext_filter(Event.objects.all(), "party").values_list("title", flat=True)),
+            {"Lost party", "Found party"}
+        )
+        event.delete()
+        self.assertEqual(list(fulltext_filter(Event.objects.all(), "found")), [])
+
+
+class ReadThroughCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value={1, 2})
+
+    def read(self):
+        return read_through_cache.read_through("user", 1, "friend_ids", self.compute)
+
+    def test_hit_until_invalidated(self):
+        self.assertEqual(self.read(), {1, 2})
+        self.assertEqual(self.read(), {1, 2})
+        self.assertEqual(self.compute.call_count, 1)
+
+        read_through_cache.invalidate("user", 1)
+        self.read()
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_hit_costs_two_round_trips_unless_sampled(self):
+        self.read()
+        with mock.patch.object(read_through_cache, "cache", wraps=cache) as counted_cache:
+            with mock.patch.object(read_through_cache.random, "randrange", return_value=1):
+                self.read()
+            self.assertEqual(counted_cache.get.call_count, 2)
+            self.assertFalse(counted_cache.incr.called)
+
+            with mock.patch.object(read_through_cache.random, "randrange", return_value=0):
+                self.read()
+            self.assertEqual(read_through_cache.get_stats(["friend_ids"])["friend_ids"][0],
+                             read_through_cache.STATS_SAMPLE_RATE)
+
+
+class PhotoOnlyModerationBackend(ModerationBackend):
+
+    def detect_photo(self, media_path):
+        return {}, False
+
+
+class ModerationBackendTestCase(TestCase):
+
+    def tearDown(self):
+        get_moderation_backend.cache_clear()
+
+    @override_settings(MODERATION_BACKEND="utils.tests.PhotoOnlyModerationBackend")
+    def test_incomplete_backend_fails_when_instantiated(self):
+        get_moderation_backend.cache_clear()
+        with self.assertRaisesMessage(TypeError, "start_video_moderation"):
+            get_moderation_backend()
+
+
+def create_photo(path: Path, shift: int = 0, quality: int = 90):
+    image = Image.new("RGB", (256, 256))
+    draw = ImageDraw.Draw(image)
+    for x in range(0, 256, 32):
+        draw.rectangle([x, 0, x + 16, 256], fill=(x, 255 - x, 128))
+    draw.ellipse([60 + shift, 60, 180, 180], fill=(250, 250, 250))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    path.write_bytes(buffer.getvalue())
+
+
+class ModerationHashCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = Path(self.directory.name)
+        create_photo(root / "photo.jpg")
+        create_photo(root / "recompressed.jpg", quality=50)
+        create_photo(root / "shifted.jpg", shift=1)
+        Image.new("RGB", (256, 256), (0, 0, 0)).save(root / "other.jpg")
+        settings = override_settings(
+            MODERATION_LOCAL_MEDIA_ROOT=str(root), MODERATION_LOCAL_LATENCY=0, MODERATION_HASH_CACHE=True
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.backend = LocalModerationBackend()
+        self.detect_photo = mock.patch.object(self.backend, "detect_photo", return_value=({"Suggestive": 99}, True))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_near_duplicates_reuse_the_verdict(self):
+        with self.detect_photo as detect_photo:
+            self.assertEqual(self.backend.check_photos(["photo.jpg"]), [({"Suggestive": 99}, True)])
+            self.assertEqual(
+                self.backend.check_photos(["recompressed.jpg", "shifted.jpg"]), [({"Suggestive": 99}, True)] * 2
+            )
+        detect_photo.assert_called_once_with("photo.jpg")
+        self.assertEqual(ModerationHash.objects.count(), 1)
+
+    def test_different_and_unreadable_photos_are_detected(self):
+        with self.detect_photo as detect_photo:
+            self.backend.check_photos(["photo.jpg"])
+            self.backend.check_photos(["other.jpg", "missing.jpg"])
+        self.assertEqual(
+            [call.args[0] for call in detect_photo.call_args_list], ["photo.jpg", "other.jpg", "missing.jpg"]
+        )
+
+    def test_failed_detection_is_not_recorded(self):
+        with mock.patch.object(self.backend, "detect_photo", side_effect=OSError("throttled")):
+            result, = self.backend.check_photos(["photo.jpg"])
+        self.assertIsInstance(result, OSError)
+        self.assertFalse(ModerationHash.objects.exists())
+
+
+def ffmpeg_result(returncode: int = 0, stdout: bytes = b"", stderr: bytes = b"") -> subprocess.CompletedProcess:
+    return subprocess.CompletedProcess(args=["ffmpeg"], returncode=returncode, stdout=stdout, stderr=stderr)
+
+
+def jpeg_frame(width: int = 640, height: int = 360) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "#336699").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@mock.patch.object(media, "get_presigned_url", return_value="https://bucket.test/video.mp4")
+class VideoThumbnailTestCase(TestCase):
+
+    def seeks(self, run: mock.Mock) -> list[str]:
+        return [call.args[0][call.args[0].index("-ss") + 1] for call in run.call_args_list]
+
+    def test_thumbnails_of_every_size_from_one_frame(self, get_presigned_url):
+        with mock.patch.object(media.subprocess, "run", return_value=ffmpeg_result(stdout=jpeg_frame())) as run:
+            thumbnails = media.generate_video_thumbnails("video.mp4", {"media": 320, "small": 64})
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(Image.open(thumbnails["media"]).size, (320, 180))
+        self.assertEqual(Image.open(thumbnails["small"]).size, (64, 36))
+
+    def test_short_video_falls_back_to_first_frame(self, get_presigned_url):
+        for first in (ffmpeg_result(), ffmpeg_result(1, stderr=b"Error while seeking")):
+            results = [first, ffmpeg_result(stdout=jpeg_frame())]
+            with mock.patch.object(media.subprocess, "run", side_effect=results) as run:
+                self.assertEqual(media.extract_video_frame("video.mp4").size, (640, 360))
+            self.assertEqual(self.seeks(run), [str(media.THUMBNAIL_SEEK), "0"])
+
+    def test_invalid_input_is_not_retryable(self, get_presigned_url):
+        invalid = ffmpeg_result(1, stderr=b"video.mp4: Invalid data found when processing input")
+        with mock.patch.object(media.subprocess, "run", return_value=invalid):
+            with self.assertRaises(media.ThumbnailError) as error:
+                media.extract_video_frame("video.mp4")
+        self.assertEqual(error.exception.reason, media.ThumbnailError.INVALID_INPUT)
+        self.assertFalse(error.exception.retryable)
+
+    def test_transient_failures_are_retryable(self, get_presigned_url):
+        refused = ffmpeg_result(1, stderr=b"Connection refused")
+        with mock.patch.object(media.subprocess, "run", return_value=refused):
+            with self.assertRaises(media.ThumbnailError) as error:
+                media.extract_video_frame("video.mp4")
+        self.assertEqual((error.exception.reason, error.exception.retryable), (media.ThumbnailError.FFMPEG, True))
+
+        timeout = subprocess.TimeoutExpired("ffmpeg", media.THUMBNAIL_TIMEOUT)
+        with mock.patch.object(media.subprocess, "run", side_effect=timeout) as run:
+            with self.assertRaises(media.ThumbnailError) as error:
+                media.extract_video_frame("video.mp4")
+        self.assertEqual((error.exception.reason, error.exception.retryable), (media.ThumbnailError.TIMEOUT, True))
+        self.assertEqual(run.call_count, 1)  # a stalled video is not read twice
+
+    def test_undecodable_frame_is_not_retryable(self, get_presigned_url):
+        with mock.patch.object(media.subprocess, "run", return_value=ffmpeg_result(stdout=b"not a jpeg")):
+            with self.assertRaises(media.ThumbnailError) as error:
+                media.extract_video_frame("video.mp4")
+        self.assertEqual((error.exception.reason, error.exception.retryable), (media.ThumbnailError.DECODE, False))